@@ -1,8 +1,21 @@
-import pandas as pd
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from urllib.parse import urlencode
+
 import dash
-from dash import html, dcc, callback, Input, Output
-import dash_leaflet as dl
-from colour import Color
+from dash import html, dcc, callback, Input, Output, State
+from dash.exceptions import PreventUpdate
+from flask import Response, request, send_file, stream_with_context
+
+# 重依赖（pandas / numpy / scipy / dash_leaflet / colour）在后台启动线程里导入，
+# 不阻塞 server 绑定端口；导入完成前这些名字为 None
+np = pd = dl = Color = cKDTree = None
 
 # Map Style Definitions
 # https://leaflet-extras.github.io/leaflet-providers/preview/
@@ -18,49 +31,161 @@ MAP_STYLES = {
     "Esri National Geographic": "https://server.arcgisonline.com/ArcGIS/rest/services/World_Street_Map/MapServer/tile/{z}/{y}/{x}.png",
     "OpenTopoMap Topography": "https://{s}.tile.opentopomap.org/{z}/{x}/{y}.png"
 }
+DEFAULT_MAP_STYLE = "Carto Voyager"
+DEFAULT_TOP_N = 10
+
+# ----------------------------
+# 0. 启动状态（分阶段计时）
+# ----------------------------
+BOOT_STATE = {"phases_ms": {}, "error": None, "total_ms": None}
+HEAVY_IMPORTS_DONE = threading.Event()
+DATA_READY = threading.Event()
+
+
+@contextmanager
+def boot_phase(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        BOOT_STATE["phases_ms"][name] = round(ms, 1)
+        print(f"[boot] {name}: {ms:.0f} ms")
+
+
+def import_heavy_modules():
+    global np, pd, dl, Color, cKDTree
+    import numpy as np
+    import pandas as pd
+    import dash_leaflet as dl
+    from colour import Color
+    from scipy.spatial import cKDTree
+
 
 # ----------------------------
 # 1. 数据加载与预处理
 # ----------------------------
-# 读取学校数据
-df_schools = pd.read_csv("schools.csv")
+SCHOOLS_CSV = "schools.csv"
+CITIES_CSV = "uscities.csv"
 
-# 过滤私立学校（不区分大小写）
-df_schools = df_schools[
-    ~df_schools["description"].str.contains("private", case=False, na=False)
-]
+# 由 load_data() 在后台线程中填充
+df_schools = tx_cities = merged_all = None
 
-# 提取城市名（移除 ", TX"）
-df_schools["city"] = df_schools["city_state"].str.replace(
-    r",\s*TX$", "", regex=True)
 
-# 移除排名缺失的行（确保排名有效）
-df_schools = df_schools.dropna(subset=["rank_state_elementary"])
+def load_data():
+    global df_schools, tx_cities, merged_all
 
-# 确保排名列为数值
-df_schools["rank_state_elementary"] = pd.to_numeric(
-    df_schools["rank_state_elementary"], errors="coerce")
-df_schools = df_schools.dropna(subset=["rank_state_elementary"])
+    with boot_phase("read_csv"):
+        # 读取学校数据
+        df_schools = pd.read_csv(SCHOOLS_CSV)
+        # 读取城市坐标（来自 simplemaps.com 免费版）
+        df_cities = pd.read_csv(CITIES_CSV)
 
-# 计算城市内部排名（数值越小，排名越高）
-df_schools["rank_city"] = (
-    df_schools.groupby("city")["rank_state_elementary"]
-    .rank(method="min", ascending=True)
-)
+    with boot_phase("preprocess"):
+        # 过滤私立学校（不区分大小写）
+        df_schools = df_schools[
+            ~df_schools["description"].str.contains("private", case=False, na=False)
+        ]
 
-# 读取城市坐标（来自 simplemaps.com 免费版）
-df_cities = pd.read_csv("uscities.csv")
-tx_cities = df_cities[df_cities["state_id"]
-                      == "TX"][["city", "lat", "lng"]].copy()
-tx_cities["city"] = tx_cities["city"].str.title()
+        # 提取城市名（移除 ", TX"）
+        df_schools["city"] = df_schools["city_state"].str.replace(
+            r",\s*TX$", "", regex=True)
 
-# 合并坐标到学校数据（用于 Top3 模式）
-df_schools = df_schools.merge(tx_cities, on="city", how="inner")
+        # 移除排名缺失的行（确保排名有效）
+        df_schools = df_schools.dropna(subset=["rank_state_elementary"])
 
-# 预计算 "All" 模式：城市学校数量
-school_counts = df_schools.groupby(
-    "city").size().reset_index(name="school_count")
-merged_all = school_counts.merge(tx_cities, on="city", how="inner")
+        # 确保排名列为数值
+        df_schools["rank_state_elementary"] = pd.to_numeric(
+            df_schools["rank_state_elementary"], errors="coerce")
+        df_schools = df_schools.dropna(subset=["rank_state_elementary"])
+
+        # 计算城市内部排名（数值越小，排名越高）
+        df_schools["rank_city"] = (
+            df_schools.groupby("city")["rank_state_elementary"]
+            .rank(method="min", ascending=True)
+        )
+        # 城市内无并列的顺序号，用于 Top N 截取（地图与导出共用）
+        df_schools["rank_city_order"] = (
+            df_schools.groupby("city")["rank_state_elementary"]
+            .rank(method="first", ascending=True)
+        )
+
+        tx_cities = df_cities[df_cities["state_id"]
+                              == "TX"][["city", "lat", "lng"]].copy()
+        tx_cities["city"] = tx_cities["city"].str.title()
+
+    with boot_phase("merge"):
+        # 合并坐标到学校数据（用于 Top3 模式）
+        df_schools = df_schools.merge(tx_cities, on="city", how="inner")
+        df_schools = df_schools.reset_index(drop=True)
+
+        # 预计算 "All" 模式：城市学校数量
+        school_counts = df_schools.groupby(
+            "city").size().reset_index(name="school_count")
+        merged_all = school_counts.merge(tx_cities, on="city", how="inner")
+
+# ----------------------------
+# 1b. 最近学校空间索引（单位球面坐标上的 KD-tree，启动时构建一次）
+# ----------------------------
+EARTH_RADIUS_MILES = 3958.8
+NEAREST_DEFAULT_K = 10
+NEAREST_DEFAULT_RADIUS = 10  # miles
+
+school_tree = None
+
+
+def to_unit_xyz(lat, lng):
+    """经纬度（度）-> 单位球面上的三维坐标，弦长与大圆距离单调对应。"""
+    lat_r = np.radians(np.atleast_1d(lat).astype(float))
+    lng_r = np.radians(np.atleast_1d(lng).astype(float))
+    cos_lat = np.cos(lat_r)
+    return np.column_stack(
+        [cos_lat * np.cos(lng_r), cos_lat * np.sin(lng_r), np.sin(lat_r)]
+    )
+
+
+def chord_to_miles(chord):
+    return 2 * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1)) * EARTH_RADIUS_MILES
+
+
+def miles_to_chord(miles):
+    return 2 * np.sin(min(miles / EARTH_RADIUS_MILES, np.pi) / 2)
+
+
+def build_spatial_index():
+    global school_tree
+    school_tree = cKDTree(to_unit_xyz(df_schools["lat"], df_schools["lng"]))
+
+
+def query_nearest_schools(lat, lng, k=None, radius_miles=None):
+    """
+    返回点击位置附近的学校，按 rank_state_elementary 排序（数值越小越好）。
+    - radius_miles: 返回 R 英里内的全部学校
+    - k: 返回最近的 k 所学校（距离相同时优先保留排名更高的）
+    """
+    cols = ["school_name", "city", "district", "rank_state_elementary", "lat", "lng"]
+    if df_schools.empty:
+        return pd.DataFrame(columns=cols + ["distance_miles"])
+
+    point = to_unit_xyz(lat, lng)[0]
+    if radius_miles is not None:
+        idx = school_tree.query_ball_point(point, miles_to_chord(radius_miles))
+    else:
+        k = max(1, min(int(k or NEAREST_DEFAULT_K), len(df_schools)))
+        dist, idx = school_tree.query(point, k=k)
+        # 学校坐标是城市中心点，大量学校距离相同：把与第 k 个等距的也取出来，
+        # 再按排名截取，避免在同一城市里随机丢掉好学校
+        idx = school_tree.query_ball_point(point, float(np.max(dist)) + 1e-12)
+
+    idx = np.asarray(idx, dtype=int)
+    result = df_schools.iloc[idx][cols].copy()
+    result["distance_miles"] = chord_to_miles(
+        np.linalg.norm(school_tree.data[idx] - point, axis=1)
+    )
+    if radius_miles is None:
+        result = result.sort_values(
+            ["distance_miles", "rank_state_elementary"]).head(k)
+    return result.sort_values(["rank_state_elementary", "distance_miles"])
 
 # ----------------------------
 # 2. 颜色函数（用于 All 模式）
@@ -68,12 +193,12 @@ merged_all = school_counts.merge(tx_cities, on="city", how="inner")
 
 
 def get_color_count(value, min_val, max_val):
+    start_color = Color("#4B0082")  # Dark Purple (Low values)
+    end_color = Color("#FFD700")  # Bright Yellow (High values)
     if min_val == max_val:
         ratio = 0.5
     else:
         ratio = (value - min_val) / (max_val - min_val)
-        start_color = Color("#4B0082")  # Dark Purple (Low values)
-        end_color = Color("#FFD700")  # Bright Yellow (High values)
     return list(start_color.range_to(end_color, 100))[int(ratio * 99)].hex
 
 # ----------------------------
@@ -133,7 +258,7 @@ def make_legend(min_val, max_val):
 # ----------------------------
 # 4. Dash App
 # ----------------------------
-app = dash.Dash(__name__)
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
 
 app.layout = html.Div(
     [
@@ -152,12 +277,37 @@ app.layout = html.Div(
                             {"label": "Overview (Bubble Map)", "value": "all"},
                             {"label": "Detailed (Top 3 Schools)",
                              "value": "top3"},
+                            {"label": "District Choropleth",
+                             "value": "district"},
                         ],
                         value="all",
                         clearable=False
                     )
                 ], style={"width": "300px", "marginRight": "20px"}),
 
+                # Cities + Top N (both views)
+                html.Div([
+                    html.Label("Cities:", style={"fontWeight": "bold"}),
+                    dcc.Dropdown(
+                        id="city-selector",
+                        options=[],
+                        value=[],
+                        multi=True,
+                        placeholder="All cities",
+                    )
+                ], style={"width": "260px", "marginRight": "20px"}),
+
+                html.Div([
+                    html.Label("Top N:", style={"fontWeight": "bold"}),
+                    dcc.Input(
+                        id="top-n-input",
+                        type="number",
+                        min=1,
+                        value=DEFAULT_TOP_N,
+                        style={"width": "70px", "display": "block"},
+                    )
+                ], style={"marginRight": "20px"}),
+
                 # Right: Map Background Style
                 html.Div([
                     html.Label("Map Background:", style={
@@ -166,25 +316,75 @@ app.layout = html.Div(
                         id="map-style-selector",
                         options=[{"label": k, "value": k}
                                  for k in MAP_STYLES.keys()],
-                        value="Carto Voyager",  # Default value
+                        value=DEFAULT_MAP_STYLE,  # Default value
                         clearable=False
                     )
-                ], style={"width": "300px"})
+                ], style={"width": "300px", "marginRight": "20px"}),
+
+                # Nearest Schools Query (map click)
+                html.Div([
+                    html.Label("Click Map For:", style={"fontWeight": "bold"}),
+                    html.Div([
+                        dcc.Dropdown(
+                            id="nearest-mode",
+                            options=[
+                                {"label": "Nearest K schools", "value": "k"},
+                                {"label": "Within R miles", "value": "radius"},
+                            ],
+                            value="k",
+                            clearable=False,
+                            style={"width": "190px", "marginRight": "8px"},
+                        ),
+                        dcc.Input(
+                            id="nearest-value",
+                            type="number",
+                            min=1,
+                            value=NEAREST_DEFAULT_K,
+                            style={"width": "80px"},
+                        ),
+                    ], style={"display": "flex", "alignItems": "center"}),
+                ])
             ],
             style={"display": "flex", "justifyContent": "center",
-                   "marginBottom": "20px"}
+                   "marginBottom": "10px"}
         ),
 
-        # Map Container
+        # Export current view
         html.Div(
             [
-                html.Div(id="map-container",
-                         style={"height": "100%", "width": "100%"}),
-                html.Div(id="legend-container"),
+                html.A("Download CSV", id="export-csv-link", href="/export",
+                       style={"marginRight": "16px"}),
+                html.A("Download Parquet", id="export-parquet-link",
+                       href="/export?format=parquet"),
             ],
-            style={"position": "relative", "height": "700px",
-                   "border": "1px solid #ddd"}
+            style={"textAlign": "center", "marginBottom": "10px",
+                   "fontFamily": "Arial"}
         ),
+
+        # Map Container + Nearest Schools Side Table
+        html.Div(
+            [
+                html.Div(
+                    [
+                        html.Div(id="map-container",
+                                 style={"height": "100%", "width": "100%"}),
+                        html.Div(id="legend-container"),
+                    ],
+                    style={"position": "relative", "height": "700px",
+                           "flex": "1", "border": "1px solid #ddd"}
+                ),
+                html.Div(
+                    id="nearest-table",
+                    children=html.P("Click anywhere on the map to find the best schools nearby."),
+                    style={"width": "380px", "height": "700px", "overflowY": "auto",
+                           "padding": "0 12px", "fontFamily": "Arial", "fontSize": "13px"}
+                ),
+            ],
+            style={"display": "flex"}
+        ),
+
+        # 数据后台加载完成前轮询，加载完成后由 update_map 关闭
+        dcc.Interval(id="boot-poll", interval=1000),
     ]
 )
 
@@ -193,20 +393,113 @@ app.layout = html.Div(
 # ----------------------------
 
 
+# 预渲染的地图视图缓存：(view_mode, map_style_name, top_n) -> (map_obj, legend)；
+# top_n 是用户随便输入的，按 LRU 只保留最近用过的 MAP_VIEW_CACHE_SIZE 个视图
+MAP_VIEW_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=MAP_VIEW_CACHE_SIZE)
+def render_cached_map(view_mode, map_style_name, top_n):
+    return render_map(view_mode, map_style_name, None, top_n)
+
+
 @callback(
     Output("map-container", "children"),
     Output("legend-container", "children"),
+    Output("boot-poll", "disabled"),
     Input("view-selector", "value"),
     Input("map-style-selector", "value"),
+    Input("city-selector", "value"),
+    Input("top-n-input", "value"),
+    Input("boot-poll", "n_intervals"),
+)
+def update_map(view_mode, map_style_name, cities, top_n, _n_intervals):
+    if BOOT_STATE["error"] is not None:
+        # 启动失败不会再好起来：停止轮询，把原因显示出来
+        return html.Div(f"Failed to load school data: {BOOT_STATE['error']}"), "", True
+    if not DATA_READY.is_set():
+        return html.Div("Loading school data..."), "", False
+
+    top_n = normalize_top_n(top_n)
+    if cities:
+        # 城市组合太多，按城市筛选的视图不缓存
+        map_obj, legend = render_map(view_mode, map_style_name, cities, top_n)
+        return map_obj, legend, True
+
+    map_obj, legend = render_cached_map(view_mode, map_style_name, top_n)
+    return map_obj, legend, True
+
+
+@callback(
+    Output("city-selector", "options"),
+    Input("boot-poll", "disabled"),
+)
+def update_city_options(_boot_done):
+    if not DATA_READY.is_set():
+        return []
+    return [{"label": c, "value": c} for c in merged_all["city"].sort_values()]
+
+
+@callback(
+    Output("export-csv-link", "href"),
+    Output("export-parquet-link", "href"),
+    Input("view-selector", "value"),
+    Input("city-selector", "value"),
+    Input("top-n-input", "value"),
 )
-def update_map(view_mode, map_style_name):
+def update_export_links(view_mode, cities, top_n):
+    params = {"view": view_mode, "top_n": normalize_top_n(top_n),
+              "cities": list(cities or [])}
+    return (
+        "/export?" + urlencode({**params, "format": "csv"}, doseq=True),
+        "/export?" + urlencode({**params, "format": "parquet"}, doseq=True),
+    )
+
+
+def normalize_top_n(top_n):
+    try:
+        return max(1, int(top_n))
+    except (TypeError, ValueError):
+        return DEFAULT_TOP_N
+
+
+def select_view_rows(view_mode, cities, top_n):
+    """
+    当前地图状态对应的行：返回 (源表, 行位置数组)，不复制数据。
+    - all: 城市聚合表 merged_all
+    - top3: df_schools 中每个城市排名前 top_n 的学校，按州排名排序
+    """
+    if view_mode == "all":
+        frame = merged_all
+        mask = np.ones(len(frame), dtype=bool)
+        sort_col = "city"
+    elif view_mode == "district":
+        frame = district_stats
+        mask = np.ones(len(frame), dtype=bool)
+        sort_col = "best_rank_state"
+    else:
+        frame = df_schools
+        mask = (frame["rank_city_order"] <= top_n).to_numpy()
+        sort_col = "rank_state_elementary"
+    if cities and "city" in frame.columns:
+        mask = mask & frame["city"].isin(cities).to_numpy()
+    positions = np.flatnonzero(mask)
+    order = np.argsort(frame[sort_col].to_numpy()[positions], kind="stable")
+    return frame, positions[order]
+
+
+def render_map(view_mode, map_style_name, cities=None, top_n=DEFAULT_TOP_N):
     # Get the URL based on the dropdown selection
     tile_url = MAP_STYLES.get(map_style_name, MAP_STYLES["Carto Light"])
+    if view_mode == "district":
+        return render_district_map(tile_url)
+
     if view_mode == "all":
-        if merged_all.empty:
+        frame, positions = select_view_rows("all", cities, top_n)
+        if len(positions) == 0:
             return html.Div("No data to display."), ""
 
-        df_all = merged_all.copy()
+        df_all = frame.iloc[positions].copy()
         min_count = int(df_all["school_count"].min())
         max_count = int(df_all["school_count"].max())
         df_all["color"] = df_all["school_count"].apply(
@@ -248,7 +541,9 @@ def update_map(view_mode, map_style_name):
             )
 
         map_obj = dl.Map(
-            [dl.TileLayer(url=tile_url), *markers],
+            [dl.TileLayer(url=tile_url), *markers,
+             dl.LayerGroup(id="nearest-layer")],
+            id="school-map",
             center=[31.9686, -99.9018],
             zoom=6,
             style={"width": "100%", "height": "100%"},
@@ -259,27 +554,23 @@ def update_map(view_mode, map_style_name):
     # ----------------------------
     # top3 mode
     # ----------------------------
-    if df_schools.empty:
+    # 每个城市取州排名最高的（数值最小）最多 top_n 所
+    frame, positions = select_view_rows("top3", cities, top_n)
+    if len(positions) == 0:
         return html.Div("No school data available."), ""
-
-    # 每个城市取州排名最高的（数值最小）最多3所
-    top3_df = (
-        df_schools.groupby("city", group_keys=False)
-        .apply(lambda g: g.nsmallest(10, "rank_state_elementary"))
-        .reset_index(drop=True)
-    )
+    top3_df = frame.iloc[positions]
 
     markers = []
     for city, city_df in top3_df.groupby("city"):
-        # 按城市排名排序，确保Top3顺序
-        city_df = city_df.sort_values("rank_city").head(10)
+        # 按城市排名排序，确保Top N顺序
+        city_df = city_df.sort_values("rank_city_order")
 
         lat, lng = city_df["lat"].iloc[0], city_df["lng"].iloc[0]
 
         # 用 Dash 组件分行，确保 tooltip 显示三排/多行
         tooltip_children = [
             html.Div(
-                html.Strong(f"{city} (Top 3)"),
+                html.Strong(f"{city} (Top {top_n})"),
                 style={"fontSize": "14px", "marginBottom": "8px"},
             )
         ]
@@ -311,7 +602,9 @@ def update_map(view_mode, map_style_name):
         )
 
     map_obj = dl.Map(
-        [dl.TileLayer(url=tile_url), *markers],
+        [dl.TileLayer(url=tile_url), *markers,
+         dl.LayerGroup(id="nearest-layer")],
+        id="school-map",
         center=[31.9686, -99.9018],
         zoom=6,
         style={"width": "100%", "height": "100%"},
@@ -319,8 +612,607 @@ def update_map(view_mode, map_style_name):
     return map_obj, ""
 
 
+def make_nearest_table(result_df, title):
+    header = html.Tr([html.Th(c) for c in ["TX Rank", "School", "City", "Miles"]])
+    rows = [
+        html.Tr(
+            [
+                html.Td(f"#{int(row['rank_state_elementary'])}"),
+                html.Td(row["school_name"]),
+                html.Td(row["city"]),
+                html.Td(f"{row['distance_miles']:.1f}"),
+            ]
+        )
+        for _, row in result_df.iterrows()
+    ]
+    return [
+        html.H4(title, style={"marginTop": "0"}),
+        html.Table([html.Thead(header), html.Tbody(rows)],
+                   style={"width": "100%", "borderCollapse": "collapse"}),
+    ]
+
+
+@callback(
+    Output("nearest-layer", "children"),
+    Output("nearest-table", "children"),
+    Input("school-map", "clickData"),
+    Input("nearest-mode", "value"),
+    Input("nearest-value", "value"),
+    prevent_initial_call=True,
+)
+def update_nearest(click_data, nearest_mode, nearest_value):
+    if not DATA_READY.is_set():
+        return [], html.P("School data is still loading...")
+    if not click_data or "latlng" not in click_data:
+        return [], html.P("Click anywhere on the map to find the best schools nearby.")
+
+    lat = click_data["latlng"]["lat"]
+    lng = click_data["latlng"]["lng"]
+    if nearest_mode == "radius":
+        radius = float(nearest_value or NEAREST_DEFAULT_RADIUS)
+        result_df = query_nearest_schools(lat, lng, radius_miles=radius)
+        title = f"{len(result_df)} school(s) within {radius:g} miles"
+    else:
+        result_df = query_nearest_schools(lat, lng, k=nearest_value)
+        title = f"{len(result_df)} nearest school(s)"
+
+    layer = [
+        dl.CircleMarker(
+            center=[lat, lng], radius=6, color="black", weight=2,
+            fillColor="white", fillOpacity=1.0,
+            children=dl.Tooltip("Selected location"),
+        )
+    ]
+    # 学校坐标为城市中心点，同一位置的学校合并成一个高亮点
+    for (loc_lat, loc_lng), loc_df in result_df.groupby(["lat", "lng"], sort=False):
+        tooltip_children = [
+            html.Div(html.Strong(loc_df["city"].iloc[0]),
+                     style={"fontSize": "14px", "marginBottom": "6px"})
+        ]
+        for _, row in loc_df.head(10).iterrows():
+            tooltip_children.append(
+                html.Div(f"#{int(row['rank_state_elementary'])} {row['school_name']}",
+                         style={"fontSize": "12px"})
+            )
+        layer.append(
+            dl.CircleMarker(
+                center=[loc_lat, loc_lng], radius=14, color="#00BFFF", weight=3,
+                fillColor="#00BFFF", fillOpacity=0.35,
+                children=dl.Tooltip(children=tooltip_children),
+            )
+        )
+
+    if result_df.empty:
+        return layer, html.P("No schools found for this location.")
+    return layer, make_nearest_table(result_df, title)
+
+
+# ----------------------------
+# 6. 只读 JSON API（挂在 Dash 的 Flask server 上）
+# ----------------------------
+# 数据版本 = 输入文件内容的哈希；ETag 由 (数据版本, 请求路径, 规范化参数) 决定，
+# 因此 If-None-Match 命中时无需渲染响应体即可直接返回 304。
+API_PREFIX = "/api/v1"
+API_MAX_PER_PAGE = 500
+API_DEFAULT_PER_PAGE = 100
+API_SCHOOL_COLUMNS = [
+    "school_name", "city", "district", "rank_state_elementary", "rank_city",
+    "grade_level", "enrollment", "student_teacher_ratio", "lat", "lng",
+]
+
+
+def compute_dataset_version(paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+
+# 由 precompute_api() 在后台线程中填充
+DATASET_VERSION = None
+api_city_aggregates = None
+district_stats = None
+
+
+def precompute_api():
+    global DATASET_VERSION, api_city_aggregates, district_stats
+    DATASET_VERSION = compute_dataset_version([SCHOOLS_CSV, CITIES_CSV])
+
+    # 学区聚合（学区 choropleth 与导出共用）
+    district_stats = (
+        df_schools.groupby("district")
+        .agg(school_count=("school_name", "size"),
+             best_rank_state=("rank_state_elementary", "min"))
+        .reset_index()
+    )
+
+    # 预计算城市聚合（学校数、最佳州排名、坐标）
+    api_city_aggregates = (
+        df_schools.groupby("city")
+        .agg(school_count=("school_name", "size"),
+             best_rank_state=("rank_state_elementary", "min"),
+             lat=("lat", "first"),
+             lng=("lng", "first"))
+        .reset_index()
+        .sort_values("city")
+    )
+
+
+def df_to_records(df):
+    # to_json 会把 NaN 转成 null，numpy 类型转成原生 JSON 类型
+    return json.loads(df.to_json(orient="records"))
+
+
+def make_etag(path, params):
+    key = f"{DATASET_VERSION}|{path}|{json.dumps(params, sort_keys=True)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+@lru_cache(maxsize=2048)
+def render_api_body(path, params_json):
+    params = json.loads(params_json)
+    if path == "cities":
+        payload = {"items": df_to_records(api_city_aggregates)}
+    elif path == "city_top":
+        city_df = df_schools[df_schools["city"] == params["city"]]
+        top_df = city_df.nsmallest(params["n"], "rank_state_elementary")
+        payload = {"city": params["city"], "n": params["n"],
+                   "items": df_to_records(top_df[API_SCHOOL_COLUMNS])}
+    else:
+        mask = pd.Series(True, index=df_schools.index)
+        if params["city"]:
+            mask &= df_schools["city"] == params["city"]
+        if params["district"]:
+            mask &= df_schools["district"] == params["district"]
+        if params["max_rank"] is not None:
+            mask &= df_schools["rank_state_elementary"] <= params["max_rank"]
+        filtered = df_schools.loc[mask, API_SCHOOL_COLUMNS].sort_values(
+            "rank_state_elementary")
+        start = (params["page"] - 1) * params["per_page"]
+        payload = {
+            "page": params["page"],
+            "per_page": params["per_page"],
+            "total": int(len(filtered)),
+            "items": df_to_records(filtered.iloc[start:start + params["per_page"]]),
+        }
+    payload["dataset_version"] = DATASET_VERSION
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def api_response(path, params):
+    etag = make_etag(path, params)
+    headers = {"Cache-Control": "public, max-age=0, must-revalidate"}
+    if request.if_none_match.contains_weak(etag):  # RFC 7232: If-None-Match 用弱比较
+        resp = Response(status=304, headers=headers)
+    else:
+        body = render_api_body(path, json.dumps(params, sort_keys=True))
+        resp = Response(body, status=200, headers=headers,
+                        mimetype="application/json")
+    resp.set_etag(etag)  # 强 ETag
+    return resp
+
+
+def api_error(message, status=400):
+    return Response(json.dumps({"error": message}), status=status,
+                    mimetype="application/json")
+
+
+def require_ready(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not DATA_READY.is_set():
+            resp = api_error("data is still loading", status=503)
+            resp.headers["Retry-After"] = "2"
+            return resp
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def parse_int_arg(name, default, min_val=None, max_val=None):
+    raw = request.args.get(name)
+    if raw is None or raw == "":
+        return default
+    val = int(raw)  # ValueError 由调用方转成 400
+    if min_val is not None:
+        val = max(min_val, val)
+    if max_val is not None:
+        val = min(max_val, val)
+    return val
+
+
+@app.server.route(f"{API_PREFIX}/cities")
+@require_ready
+def api_cities():
+    return api_response("cities", {})
+
+
+@app.server.route(f"{API_PREFIX}/cities/<city>/top")
+@require_ready
+def api_city_top(city):
+    try:
+        n = parse_int_arg("n", 3, min_val=1, max_val=API_MAX_PER_PAGE)
+    except ValueError:
+        return api_error("n must be an integer")
+    if city not in set(api_city_aggregates["city"]):
+        return api_error(f"unknown city: {city}", status=404)
+    return api_response("city_top", {"city": city, "n": n})
+
+
+@app.server.route(f"{API_PREFIX}/schools")
+@require_ready
+def api_schools():
+    try:
+        params = {
+            "page": parse_int_arg("page", 1, min_val=1),
+            "per_page": parse_int_arg("per_page", API_DEFAULT_PER_PAGE,
+                                      min_val=1, max_val=API_MAX_PER_PAGE),
+            "max_rank": parse_int_arg("max_rank", None),
+        }
+    except ValueError:
+        return api_error("page, per_page and max_rank must be integers")
+    params["city"] = request.args.get("city") or None
+    params["district"] = request.args.get("district") or None
+    return api_response("schools", params)
+
+
+# ----------------------------
+# 6b. 流式导出当前视图（CSV / Parquet）
 # ----------------------------
-# 6. 运行
+# 只持有行位置数组，按块切片写出；任何时刻内存里最多一个块的副本。
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_COLUMNS = {
+    "all": ["city", "school_count", "lat", "lng"],
+    "district": ["district", "school_count", "best_rank_state"],
+    "top3": ["school_name", "city", "district", "rank_state_elementary",
+             "rank_city", "grade_level", "enrollment", "student_teacher_ratio",
+             "lat", "lng"],
+}
+
+
+def iter_view_chunks(frame, positions, columns):
+    for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+        yield frame.iloc[positions[start:start + EXPORT_CHUNK_ROWS]][columns]
+
+
+def stream_csv(frame, positions, columns):
+    header = True
+    for chunk in iter_view_chunks(frame, positions, columns):
+        yield chunk.to_csv(index=False, header=header)
+        header = False
+    if header:  # 没有数据行也输出表头
+        yield frame.iloc[:0][columns].to_csv(index=False)
+
+
+class ChunkSink(io.RawIOBase):
+    """ParquetWriter 的输出端：累积写入的字节，由生成器按 row group 取走。"""
+
+    def __init__(self):
+        super().__init__()
+        self.pending = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.pending.append(bytes(b))
+        self.position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.pending)
+        self.pending = []
+        return data
+
+
+def stream_parquet(frame, positions, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # 数值列沿用 pandas dtype，其余一律按字符串（避免按首块推断出 null 类型）
+    schema = pa.schema([
+        (c, pa.from_numpy_dtype(frame[c].dtype)
+         if pd.api.types.is_numeric_dtype(frame[c]) else pa.string())
+        for c in columns
+    ])
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in iter_view_chunks(frame, positions, columns):
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+@app.server.route("/export")
+@require_ready
+def export_view():
+    view_mode = request.args.get("view", "all")
+    if view_mode not in EXPORT_COLUMNS:
+        return api_error(f"unknown view: {view_mode}")
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "parquet"):
+        return api_error(f"unsupported format: {fmt}")
+    top_n = normalize_top_n(request.args.get("top_n"))
+    cities = [c for v in request.args.getlist("cities") for c in v.split(",") if c]
+
+    frame, positions = select_view_rows(view_mode, cities, top_n)
+    columns = EXPORT_COLUMNS[view_mode]
+    filename = f"texas_schools_{view_mode}.{fmt}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if fmt == "csv":
+        body = stream_csv(frame, positions, columns)
+        mimetype = "text/csv"
+    else:
+        body = stream_parquet(frame, positions, columns)
+        mimetype = "application/vnd.apache.parquet"
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
 # ----------------------------
+# 6c. 学区边界 choropleth（多分辨率几何金字塔）
+# ----------------------------
+# 边界文件需本地提供（GeoJSON，例如 TEA 发布的学区边界），DISTRICT_NAME_FIELD
+# 为其中的学区名属性。启动时按缩放段预先简化几何，写成紧凑 GeoJSON 缓存到
+# GEO_CACHE_DIR；全州视图只下发粗几何，放大后才加载细节。
+DISTRICT_BOUNDARIES_FILE = "school_districts.geojson"
+DISTRICT_NAME_FIELD = "NAME"
+GEO_CACHE_DIR = "geo_cache"
+# 每个缩放段：(该段最大 zoom, 简化容差[度], 坐标保留小数位)；容差 0 表示原始精度
+DISTRICT_ZOOM_BANDS = [
+    (7, 0.01, 3),
+    (9, 0.003, 4),
+    (11, 0.001, 5),
+    (99, 0.0, 6),
+]
+
+# 由 build_district_pyramid() 在后台线程中填充：band -> 缓存文件路径
+district_pyramid = {}
+DISTRICT_GEO_VERSION = None
+district_count_range = (0, 0)
+
+
+def normalize_district_name(name):
+    """统一学区名写法，使 schools.csv 的全称能与边界文件的缩写（ISD/CISD）对上。"""
+    s = " ".join(str(name).upper().replace(".", "").split())
+    for full, short in [
+        ("CONSOLIDATED INDEPENDENT SCHOOL DISTRICT", "CISD"),
+        ("INDEPENDENT SCHOOL DISTRICT", "ISD"),
+        ("COMMON SCHOOL DISTRICT", "CSD"),
+        ("MUNICIPAL SCHOOL DISTRICT", "MSD"),
+    ]:
+        if s.endswith(full):
+            s = s[: -len(full)] + short
+    return s
+
+
+def band_for_zoom(zoom):
+    zoom = 6 if zoom is None else zoom
+    for band, (max_zoom, _tol, _ndigits) in enumerate(DISTRICT_ZOOM_BANDS):
+        if zoom <= max_zoom:
+            return band
+    return len(DISTRICT_ZOOM_BANDS) - 1
+
+
+def round_coords(coords, ndigits):
+    if isinstance(coords, (int, float)):
+        return round(coords, ndigits)
+    return [round_coords(c, ndigits) for c in coords]
+
+
+def build_district_pyramid():
+    global DISTRICT_GEO_VERSION, district_count_range
+    if not os.path.exists(DISTRICT_BOUNDARIES_FILE):
+        print(f"[boot] {DISTRICT_BOUNDARIES_FILE} not found; district view disabled")
+        return
+    from shapely.geometry import mapping, shape
+
+    version = compute_dataset_version([DISTRICT_BOUNDARIES_FILE])
+    # 缩放段和学区名属性变了，缓存的几何就不能再用
+    version = hashlib.sha256(
+        f"{version}|{DATASET_VERSION}|{DISTRICT_ZOOM_BANDS}|{DISTRICT_NAME_FIELD}".encode()
+    ).hexdigest()[:16]
+    paths = {
+        band: os.path.abspath(
+            os.path.join(GEO_CACHE_DIR, f"districts_{version}_{band}.geojson"))
+        for band in range(len(DISTRICT_ZOOM_BANDS))
+    }
+
+    stats = {
+        normalize_district_name(row["district"]): row
+        for _, row in district_stats.iterrows()
+    }
+    min_count = int(district_stats["school_count"].min()) if stats else 0
+    max_count = int(district_stats["school_count"].max()) if stats else 0
+    district_count_range = (min_count, max_count)
+
+    if not all(os.path.exists(p) for p in paths.values()):
+        with open(DISTRICT_BOUNDARIES_FILE, encoding="utf-8") as f:
+            source = json.load(f)
+
+        # 属性与几何分开准备，每个缩放段只重新简化几何
+        prepared = []
+        for feat in source.get("features", []):
+            if not feat.get("geometry"):
+                continue
+            name = (feat.get("properties") or {}).get(DISTRICT_NAME_FIELD, "")
+            row = stats.get(normalize_district_name(name))
+            count = int(row["school_count"]) if row is not None else 0
+            props = {
+                "district": name,
+                "school_count": count,
+                "fillColor": get_color_count(count, min_count, max_count)
+                if row is not None else "#cccccc",
+                "tooltip": f"{name}: {count} school(s)"
+                + (f" | best TX Rank #{int(row['best_rank_state'])}"
+                   if row is not None else ""),
+            }
+            prepared.append((props, shape(feat["geometry"])))
+
+        os.makedirs(GEO_CACHE_DIR, exist_ok=True)
+        for band, (_max_zoom, tol, ndigits) in enumerate(DISTRICT_ZOOM_BANDS):
+            features = []
+            for props, geom in prepared:
+                if tol:
+                    geom = geom.simplify(tol, preserve_topology=True)
+                if geom.is_empty:
+                    continue
+                gj = mapping(geom)
+                features.append({
+                    "type": "Feature",
+                    "properties": props,
+                    "geometry": {"type": gj["type"],
+                                 "coordinates": round_coords(gj["coordinates"], ndigits)},
+                })
+            tmp_path = paths[band] + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"type": "FeatureCollection", "features": features},
+                          f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, paths[band])
+
+    district_pyramid.update(paths)
+    DISTRICT_GEO_VERSION = version
+
+
+def district_band_url(band):
+    return f"/geo/districts/{DISTRICT_GEO_VERSION}/{band}.geojson"
+
+
+def render_district_map(tile_url):
+    if not district_pyramid:
+        return html.Div(
+            f"District boundaries are not available ({DISTRICT_BOUNDARIES_FILE} not found)."), ""
+
+    map_obj = dl.Map(
+        [
+            dl.TileLayer(url=tile_url),
+            dl.GeoJSON(
+                id="district-layer",
+                url=district_band_url(band_for_zoom(6)),
+                style={"variable": "dashExtensions.default.districtStyle"},
+                hoverStyle={"weight": 3, "color": "#333"},
+            ),
+            dl.LayerGroup(id="nearest-layer"),
+        ],
+        id="school-map",
+        center=[31.9686, -99.9018],
+        zoom=6,
+        eventHandlers={"zoomend": {"variable": "dashExtensions.default.trackZoom"}},
+        style={"width": "100%", "height": "100%"},
+    )
+    return map_obj, make_legend(*district_count_range)
+
+
+@callback(
+    Output("district-layer", "url"),
+    Input("school-map", "zoom"),
+    State("view-selector", "value"),
+    prevent_initial_call=True,
+)
+def update_district_resolution(zoom, view_mode):
+    # 只有学区视图里有 district-layer，其它视图缩放时不更新
+    if view_mode != "district" or not district_pyramid:
+        raise PreventUpdate
+    return district_band_url(band_for_zoom(zoom))
+
+
+@app.server.route("/geo/districts/<version>/<int:band>.geojson")
+@require_ready
+def district_geojson(version, band):
+    if version != DISTRICT_GEO_VERSION or band not in district_pyramid:
+        return api_error("unknown district geometry", status=404)
+    # URL 中带版本号，内容不可变，可长期缓存
+    return send_file(district_pyramid[band], mimetype="application/geo+json",
+                     max_age=365 * 24 * 3600, conditional=True, etag=True)
+
+
+# ----------------------------
+# 7. 启动：后台加载 + 存活/就绪探针
+# ----------------------------
+# server 立即绑定端口；导入重依赖、读 CSV、合并、建索引、预渲染常用视图
+# 都在后台线程中完成，/readyz 在全部完成后才返回 200。
+WARMUP_VIEWS = [("all", DEFAULT_MAP_STYLE), ("top3", DEFAULT_MAP_STYLE)]
+PROBE_PATHS = {"/healthz", "/readyz"}
+
+
+def warm_up_views():
+    for view_mode, map_style_name in WARMUP_VIEWS:
+        try:
+            render_cached_map(view_mode, map_style_name, DEFAULT_TOP_N)
+        except Exception as e:
+            # 预渲染失败不影响就绪，首次请求时会再渲染一次
+            print(f"[boot] warm-up of {view_mode!r} view failed: {e}")
+
+
+def boot_worker():
+    t0 = time.perf_counter()
+    try:
+        with boot_phase("import_heavy_modules"):
+            import_heavy_modules()
+        HEAVY_IMPORTS_DONE.set()
+        load_data()
+        with boot_phase("spatial_index"):
+            build_spatial_index()
+        with boot_phase("api_precompute"):
+            precompute_api()
+        with boot_phase("district_pyramid"):
+            build_district_pyramid()
+        with boot_phase("warm_up_views"):
+            warm_up_views()
+        DATA_READY.set()
+    except Exception as e:
+        BOOT_STATE["error"] = repr(e)
+        print(f"[boot] failed: {e!r}")
+        raise
+    finally:
+        BOOT_STATE["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        print(f"[boot] total: {BOOT_STATE['total_ms']:.0f} ms")
+
+
+@app.server.before_request
+def wait_for_component_imports():
+    # Dash 在渲染首页时收集组件库的 JS，dash_leaflet 必须已经导入；
+    # 探针路由不等待
+    if request.path not in PROBE_PATHS:
+        HEAVY_IMPORTS_DONE.wait(timeout=30)
+
+
+@app.server.route("/healthz")
+def healthz():
+    return Response(json.dumps({"status": "alive"}), mimetype="application/json")
+
+
+@app.server.route("/readyz")
+def readyz():
+    ready = DATA_READY.is_set()
+    body = {"ready": ready, **BOOT_STATE}
+    return Response(json.dumps(body), status=200 if ready else 503,
+                    mimetype="application/json")
+
+
+def start_boot_thread():
+    thread = threading.Thread(target=boot_worker, name="data-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+# ----------------------------
+# 8. 运行
+# ----------------------------
+DEBUG = True
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    # debug 模式下 reloader 的父进程只监视文件、不处理请求，只在子进程（WERKZEUG_RUN_MAIN）里加载数据
+    if not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        boot_thread = start_boot_thread()
+    app.run(debug=DEBUG)
+else:
+    # 被 WSGI server 导入（例如 gunicorn app_top3_dynamic_radius:app.server）
+    boot_thread = start_boot_thread()
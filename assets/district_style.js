@@ -0,0 +1,17 @@
+// dash-leaflet 函数型属性通过 {"variable": "dashExtensions.default.xxx"} 引用这里的函数
+window.dashExtensions = Object.assign({}, window.dashExtensions);
+window.dashExtensions.default = Object.assign({}, window.dashExtensions.default, {
+    // 学区 choropleth：颜色在服务端预先写入 feature.properties.fillColor
+    districtStyle: function (feature) {
+        return {
+            fillColor: feature.properties.fillColor,
+            color: "white",
+            weight: 1,
+            fillOpacity: 0.7
+        };
+    },
+    // 把当前缩放级别回写到 Map 的 zoom 属性，用于切换几何分辨率
+    trackZoom: function (e, ctx) {
+        ctx.setProps({zoom: e.target.getZoom()});
+    }
+});
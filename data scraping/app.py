@@ -1,21 +1,145 @@
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 import time
-import random
 import json
 import os
-
-
-BASE_URL = "https://www.usnews.com/education/k12/elementary-schools/texas"
-START_PAGE = 1  # 例如从 200 开始
+import io
+import hashlib
+import queue
+import socket
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from http_fetch import HttpFetcher, fetch_outcome
+from crawl_ledger import CrawlLedger
+from rate_limiter import AdaptiveRateLimiter
+from fast_extract import extract_schools_from_html
+from page_archive import PageArchive
+from page_ready import wait_for_page_ready
+from cdp_network import (
+    NetworkLog,
+    blocked_patterns,
+    drain_network_events,
+    enable_network_capture,
+    enable_performance_log,
+    install_request_blocking,
+    json_responses,
+    summarize_network_events,
+)
+from json_records import find_school_records
+from dedup_index import DedupIndex, normalize_school_url
+from work_queue import LeaseKeeper, WorkQueue
+from telemetry import PageTelemetry
+
+
+# 可用环境变量指向本地替身站点（见 fixture_server.py）
+BASE_URL = os.environ.get(
+    "SCRAPER_BASE_URL", "https://www.usnews.com/education/k12/elementary-schools/texas"
+)
+START_PAGE = 1
 MAX_PAGES = 661
 
 
 OUT_DEBUG_JSONL = "debug_raw_card_text.jsonl"
 
+# 抓取台账：记录每页状态，重启时自动跳过已完成的页、只重试失败/被拦截的页。
+# 想从头重新抓取时，把台账和 debug JSONL 一起删掉。
+LEDGER_DB = "crawl_ledger.sqlite"
+MAX_PAGE_ATTEMPTS = 5
+RETRY_BACKOFF = (30.0, 900.0)  # 重试退避：首次等待秒数、上限秒数（指数增长）
+
+# 跨运行去重：按规范化的 school_url 记录已经写出过的学校，排名在翻页/多次运行之间
+# 挪动时，同一所学校不会再写一遍。设为 None 关闭；从头重抓时和台账一起删掉。
+DEDUP_DB = "seen_schools.sqlite"
+DEDUP_BLOOM_CAPACITY = 1_000_000  # Bloom 过滤器按这个规模分配内存（约 1.8 MB），None 不用
+_dedup = None
+_dedup_lock = threading.Lock()
+
+# 刷新重抓（配合 change_detect.py 做增量更新）：设置 SCRAPER_REFRESH=<批次名> 后关掉跨运行去重，
+# 每页都完整写出；台账和 debug 输出换成这一批次专用的文件，同一批次中断后用同一个批次名续抓。
+# SCRAPER_REFRESH=1 每次运行生成一个新批次名（到秒的时间戳），总是从头抓；续抓时把启动时打印的批次名传回来。
+REFRESH_TAG = os.environ.get("SCRAPER_REFRESH", "")
+if REFRESH_TAG not in ("", "0"):
+    if REFRESH_TAG == "1":
+        REFRESH_TAG = time.strftime("%Y%m%d-%H%M%S")
+    DEDUP_DB = None
+    LEDGER_DB = f"crawl_ledger.refresh-{REFRESH_TAG}.sqlite"
+    OUT_DEBUG_JSONL = f"debug_raw_card_text.refresh-{REFRESH_TAG}.jsonl"
+else:
+    REFRESH_TAG = None
+
+# 并发模式：>1 时启用 N 个 headless driver 的 worker 池
+NUM_WORKERS = 1
+
+# 多进程 / 多机器：设置 SCRAPER_WORK_QUEUE 指向共享的队列数据库（见 work_queue.py）后，
+# 每个进程都是一个 worker，从队列领页面（带租约和心跳），结果写到自己的
+# WORKER_OUTPUT_DIR/<worker_id>.jsonl；全部完成后用 `python work_queue.py <db> merge` 合并
+# （默认合并到 merged_raw_card_text.jsonl）
+WORK_QUEUE_DB = os.environ.get("SCRAPER_WORK_QUEUE")
+WORKER_ID = os.environ.get("SCRAPER_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEASE_SECONDS = 120.0  # 租约时长；worker 每 1/3 租约续一次，死掉后最多这么久页面就会被重新领走
+WORKER_OUTPUT_DIR = "worker_output"
+
+# 单浏览器流水线：driver 开下一页的同时，PARSE_THREADS 个线程解析上一页；
+# 写入线程攒够 FSYNC_EVERY_PAGES 页或隔 FSYNC_INTERVAL 秒才 fsync 并记账一次
+PARSE_THREADS = 2
+FSYNC_EVERY_PAGES = 20
+FSYNC_INTERVAL = 5.0
+
+# 请求节奏：所有模式/所有 worker 共用一个自适应令牌桶（单位：页/秒）。
+# 页面正常时慢慢提速，遇到拦截/超时立即减半并冷却；调速记录写到 RATE_LOG。
+RATE_LIMIT = {
+    "initial_rate": 0.2,
+    "min_rate": 0.02,
+    "max_rate": 2.0,
+    "increase": 0.02,
+    "decrease_factor": 0.5,
+    "cooldown": 60.0,
+}
+RATE_LOG = "rate_decisions.jsonl"
+
+# 抓取方式："http" = 先用 HTTP 客户端取 HTML，只有被拦截/纯 JS 的页面才回退到浏览器；
+#          "browser" = 每页都走 Chrome
+FETCH_MODE = "http"
+HTTP_CONCURRENCY = 4  # 每批并发请求数（同时也是连接池大小）
+
+# 页面就绪判定（见 page_ready.py）：卡片数达到 CARDS_PER_PAGE 且 DOM 安静 READY_QUIET_MS 毫秒
+# 就开始解析，最多等 READY_TIMEOUT 秒，取代原来固定的 3~5 秒等待
+CARDS_PER_PAGE = 10
+READY_QUIET_MS = 400
+READY_TIMEOUT = 15.0
+
+# 解析引擎："fast" = lxml 单趟提取（fast_extract.py），"soup" = 原来的 BeautifulSoup 版本。
+# 两者输出一致，可用 bench_extract.py 在保存的页面上对比速度并校验。
+EXTRACTOR = "fast"
+
+# 原始 HTML 归档：每页抓到的 HTML 压缩后追加到这里，解析逻辑改了之后可以
+# 用 `python page_archive.py reparse` 离线重新提取，不用重新抓取。设为 None 关闭。
+ARCHIVE_DIR = "page_archive"
+_archive = None
+_archive_lock = threading.Lock()
+
+# 浏览器流量：通过 DevTools 拦截字体/样式/图片/广告统计脚本（规则见 cdp_network.py），
+# 并统计每页实际发出的请求数和传输字节，逐页写到 NETWORK_LOG
+BLOCK_REQUESTS = True
+NETWORK_LOG = "page_network.jsonl"
+network_log = NetworkLog(NETWORK_LOG)
+
+# 逐页遥测：导航 / 等待 / 解析 / 写入各阶段耗时、行数、字节数、是否被拦截、重试次数，
+# 写到 TELEMETRY_LOG；运行结束时打印 rows/sec、各阶段 p50/p95 和拦截率。
+# 之后也可以用 `python telemetry.py page_telemetry.jsonl` 单独汇总。
+TELEMETRY_LOG = "page_telemetry.jsonl"
+telemetry = PageTelemetry(TELEMETRY_LOG)
+
+# JSON 捕获模式：从 DevTools 网络日志里取站点自己加载结果列表用的 JSON 响应，
+# 写出带类型的结构化记录（OUT_RECORDS_JSONL），行数据以它为准、不再从卡片文字反推字段。
+# 页面 HTML 照常归档、照常写 debug 行；记录文件和 debug JSONL 一样按台账里的偏移提交，
+# 重抓的页不会重复。某页没捕获到学校数据时行数据退回 DOM 解析的结果。
+CAPTURE_JSON = False
+CAPTURE_URL_MARKERS = None  # 例如 ["/api/"]，只看 URL 含这些片段的 JSON 响应；None 表示全部
+OUT_RECORDS_JSONL = "school_records.jsonl"
+
 
 def build_driver():
     options = webdriver.ChromeOptions()
@@ -35,8 +159,13 @@ def build_driver():
         "profile.managed_default_content_settings.images": 2,
     }
     options.add_experimental_option("prefs", prefs)
+    enable_performance_log(options)
 
     driver = webdriver.Chrome(options=options)
+    if BLOCK_REQUESTS:
+        install_request_blocking(driver, blocked_patterns())
+    if CAPTURE_JSON:
+        enable_network_capture(driver)
     driver.execute_cdp_cmd(
         "Page.addScriptToEvaluateOnNewDocument",
         {"source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"},
@@ -149,51 +278,712 @@ def extract_schools_from_soup(soup, page_number, debug_fp=None):
     return list(unique.values())
 
 
-def get_page_data(page_number, driver, debug_fp=None):
-    url = f"{BASE_URL}?page={page_number}#results"
-    print(f"--- [Headless] Opening page {page_number} -> {url}")
+def page_url(page_number):
+    return f"{BASE_URL}?page={page_number}#results"
 
-    try:
-        driver.get(url)
-        time.sleep(random.uniform(3, 5))
 
-        if "Access Denied" in driver.title or "Just a moment" in driver.title:
-            print(f"⚠️ Blocked on page {page_number} (Title: {driver.title})")
-            return []
+def archive_page(html, page_number):
+    global _archive
+    if ARCHIVE_DIR is None:
+        return
+    with _archive_lock:
+        if _archive is None:
+            _archive = PageArchive(ARCHIVE_DIR)
+    _archive.append(page_number, html, url=page_url(page_number))
 
-        try:
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.ID, "results"))
-            )
-        except Exception:
-            print(f"   Wait timeout on page {page_number}.")
 
-        soup = BeautifulSoup(driver.page_source, "html.parser")
+def parse_page_html(html, page_number, debug_fp=None):
+    archive_page(html, page_number)
+    start = time.perf_counter()
+    if EXTRACTOR == "fast":
+        rows = extract_schools_from_html(html, page_number, debug_fp=debug_fp)
+    else:
+        soup = BeautifulSoup(html, "html.parser")
         rows = extract_schools_from_soup(soup, page_number, debug_fp=debug_fp)
+    telemetry.stage(page_number, "parse_ms", (time.perf_counter() - start) * 1000)
+    print(f"--- Page {page_number}: extracted {len(rows)} rows")
+    return rows
+
+
+def make_rate_limiter():
+    return AdaptiveRateLimiter(**RATE_LIMIT, log_path=RATE_LOG)
+
+
+def get_page_result(page_number, driver, debug_fp=None, limiter=None, records_fp=None):
+    """
+    打开一页并解析，返回 (status, rows)：
+    status = ok / empty / blocked / timeout / error
+    传入 limiter 时，打开页面前先取令牌，结果反馈给 limiter 调速。
+    捕获模式下这一页的 JSON 记录写进 records_fp（和 debug_fp 一样，一般是交给提交逻辑的缓冲）。
+    """
+    loaded = load_page(page_number, driver, limiter=limiter)
+    return finish_page(loaded, debug_fp=debug_fp, limiter=limiter, records_fp=records_fp)
+
 
-        print(f"--- Page {page_number}: extracted {len(rows)} rows")
-        return rows
+def load_page(page_number, driver, limiter=None):
+    """
+    浏览器这一半：取令牌、打开页面、等就绪、（捕获模式下）取 JSON 记录、拿到 page_source。
+    返回 dict，交给 finish_page 解析；driver 随后就可以去开下一页。
+    """
+    if limiter is not None:
+        limiter.acquire()
+    page_network_stats(driver)  # 清掉上一页残留的网络事件
+    events = []  # JSON 捕获时已经读出的网络事件，流量统计也要算上
+    loaded = {"page": page_number, "status": None, "html": None, "rows": [], "timed_out": False}
+
+    url = page_url(page_number)
+    print(f"--- [Headless] Opening page {page_number} -> {url}")
+    try:
+        start = time.perf_counter()
+        driver.get(url)
+        telemetry.stage(page_number, "navigate_ms", (time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        ready = wait_for_page_ready(
+            driver, expected_cards=CARDS_PER_PAGE, quiet_ms=READY_QUIET_MS, timeout=READY_TIMEOUT
+        )
+        telemetry.stage(page_number, "wait_ms", (time.perf_counter() - start) * 1000)
+
+        if ready["state"] == "blocked" or "Access Denied" in driver.title or "Just a moment" in driver.title:
+            print(f"⚠️ Blocked on page {page_number} (Title: {driver.title})")
+            loaded["status"] = "blocked"
+        else:
+            loaded["timed_out"] = ready["state"] != "ready"
+            if loaded["timed_out"]:
+                print(f"   Wait {ready['state']} on page {page_number} "
+                      f"({ready['cards']} cards after {ready['waited_ms']} ms).")
+            else:
+                print(f"   Page {page_number} ready: {ready['cards']} cards in {ready['waited_ms']} ms.")
+
+            if CAPTURE_JSON:
+                loaded["rows"] = capture_page_records(driver, page_number, events)
+            # 捕获模式也要 HTML：归档和 debug 行与 DOM 模式保持一致
+            loaded["html"] = driver.page_source
 
     except Exception as e:
         print(f"Error on page {page_number}: {e}")
+        loaded["status"] = "error"
+
+    loaded["network"] = page_network_stats(driver, events)
+    return loaded
+
+
+def finish_page(loaded, debug_fp=None, limiter=None, records_fp=None):
+    """
+    解析这一半（不碰 driver，可以放在别的线程）：得出最终 status，记录限速和流量。
+    捕获到 JSON 记录时，行数据用记录（写进 records_fp），HTML 仍然归档并写 debug 行。
+    """
+    page_number = loaded["page"]
+    status, rows = loaded["status"], loaded["rows"]
+    if status is None:
+        try:
+            dom_rows = parse_page_html(loaded["html"], page_number, debug_fp=debug_fp)
+            if rows:
+                if records_fp is not None:
+                    for rec in rows:
+                        write_jsonl_line(records_fp, rec)
+                print(f"--- Page {page_number}: using {len(rows)} JSON records "
+                      f"(DOM had {len(dom_rows)} rows, kept as debug lines)")
+            else:
+                rows = dom_rows
+            if rows:
+                status = "ok"
+            else:
+                status = "timeout" if loaded["timed_out"] else "empty"
+        except Exception as e:
+            print(f"Error parsing page {page_number}: {e}")
+            status, rows = "error", []
+
+    if limiter is not None:
+        limiter.record(status, detail={"page": page_number, "via": "browser"})
+
+    stats = loaded.get("network")
+    if stats is None and loaded["html"] is not None:
+        # 没有 performance 日志时退而记 HTML 大小
+        telemetry.note(page_number, bytes=len(loaded["html"].encode("utf-8")))
+    if stats is not None:
+        telemetry.note(page_number, bytes=stats["bytes"])
+        network_log.write(page_number, status, stats)
+        print(f"   Page {page_number} network: {stats['requests']} requests, "
+              f"{stats['bytes'] / 1024:.0f} KB, {stats['blocked']} blocked")
+    return status, rows
+
+
+def page_network_stats(driver, events=()):
+    """这一页的流量统计；driver 没开 performance 日志时返回 None。"""
+    try:
+        return summarize_network_events(list(events) + drain_network_events(driver))
+    except Exception:
+        return None
+
+
+def capture_page_records(driver, page_number, events):
+    """
+    从这一页的 JSON 响应里取学校记录并返回（由 finish_page 写出、随页面一起提交）；
+    没有捕获到时返回空列表（调用方回退到 DOM 解析）。
+    """
+    try:
+        events.extend(drain_network_events(driver))
+        payloads = json_responses(driver, events, CAPTURE_URL_MARKERS)
+    except Exception as e:
+        print(f"   JSON capture failed on page {page_number}: {e}")
         return []
 
+    records = {}
+    for _url, payload in payloads:
+        for rec in find_school_records(payload, page_number):
+            records.setdefault(rec["school_url"], rec)
+    records = list(records.values())
+    if records:
+        print(f"--- Page {page_number}: captured {len(records)} records from "
+              f"{len(payloads)} JSON response(s)")
+    return records
+
+
+def get_page_data(page_number, driver, debug_fp=None, limiter=None):
+    _status, rows = get_page_result(page_number, driver, debug_fp=debug_fp, limiter=limiter)
+    return rows
+
+
+def open_ledger():
+    ledger = CrawlLedger(
+        LEDGER_DB,
+        max_attempts=MAX_PAGE_ATTEMPTS,
+        backoff_base=RETRY_BACKOFF[0],
+        backoff_cap=RETRY_BACKOFF[1],
+    )
+    ledger.seed(range(START_PAGE, MAX_PAGES + 1))
+    return ledger
+
+
+def open_debug_output(ledger, path=OUT_DEBUG_JSONL):
+    """
+    以追加方式打开 debug JSONL。台账记录了最后一次提交后的文件长度；
+    文件比它长说明上次在写完某页、记账之前中断了，把这段未提交的内容截掉，
+    该页会被重新抓取，因此不会出现重复的页块。
+    """
+    return open_committed_output(ledger, path, "debug_offset")
+
+
+def open_records_output(ledger, path=OUT_RECORDS_JSONL):
+    """JSON 捕获模式的记录文件，和 debug JSONL 一样按台账里的偏移截掉未提交的部分；不捕获时 with 得到 None。"""
+    if not CAPTURE_JSON:
+        return contextlib.nullcontext()
+    return open_committed_output(ledger, path, "records_offset")
+
+
+def open_committed_output(ledger, path, offset_attr):
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    committed = getattr(ledger, offset_attr)
+    if committed is None or size < committed:
+        # 第一次使用台账（或文件被替换过）：以当前文件内容为准
+        setattr(ledger, offset_attr, size)
+    elif size > committed:
+        print(f"Truncating {size - committed} uncommitted byte(s) from {path}.")
+        with open(path, "r+b") as f:
+            f.truncate(committed)
+    return open(path, "ab")
+
+
+def sync_output(fp):
+    """fsync 一个输出文件，返回提交用的偏移；没有这个输出时返回 None。"""
+    if fp is None:
+        return None
+    fp.flush()
+    os.fsync(fp.fileno())
+    return fp.tell()
+
+
+def get_dedup_index():
+    global _dedup
+    if DEDUP_DB is None:
+        return None
+    with _dedup_lock:
+        if _dedup is None:
+            _dedup = DedupIndex(DEDUP_DB, bloom_capacity=DEDUP_BLOOM_CAPACITY)
+    return _dedup
+
+
+def drop_seen_schools(text, batch_seen=None):
+    """
+    去掉 debug 行里已经进过去重索引的学校，返回 (保留的文本, 保留的 school_url 列表)。
+    batch_seen：还没提交进索引、但本批已经写过的规范 URL（会被更新）。
+    """
+    index = get_dedup_index()
+    if index is None or not text:
+        return text, []
+    items = [(line, json.loads(line).get("href")) for line in text.splitlines(keepends=True)]
+    fresh = {normalize_school_url(u) for u in index.unseen([href for _, href in items])}
+    if batch_seen is not None:
+        fresh -= batch_seen
+
+    kept_lines, kept_urls = [], []
+    for line, href in items:
+        url = normalize_school_url(href)
+        if url in fresh:
+            fresh.discard(url)
+            kept_lines.append(line)
+            kept_urls.append(url)
+    if batch_seen is not None:
+        batch_seen.update(kept_urls)
+    return "".join(kept_lines), kept_urls
+
+
+def drop_seen_records(records_text, text, kept_urls):
+    """
+    捕获模式的记录跟着 debug 行一起去重：text 是去重前的 debug 行，
+    其中因为已经抓过而被 drop_seen_schools 去掉的学校，对应的记录（按规范 school_url）也去掉。
+    """
+    if get_dedup_index() is None or not records_text:
+        return records_text
+    dropped = {normalize_school_url(json.loads(line).get("href")) for line in text.splitlines()}
+    dropped -= set(kept_urls)
+    if not dropped:
+        return records_text
+    return "".join(
+        line for line in records_text.splitlines(keepends=True)
+        if normalize_school_url(json.loads(line).get("school_url")) not in dropped
+    )
+
+
+def commit_page(ledger, debug_fp, page, status, text, n_rows, records_fp=None, records_text=""):
+    """
+    页面结果落盘并记账：先写 debug 行（和捕获的记录）并 fsync，再把新的文件偏移和页状态一起提交，
+    最后把写出的学校记入去重索引（顺序保证崩溃时最多重复，不会丢）。
+    """
+    start = time.perf_counter()
+    if status == "ok":
+        n_lines = text.count("\n")
+        kept_text, urls = drop_seen_schools(text)
+        data = kept_text.encode("utf-8")
+        debug_fp.write(data)
+        if records_fp is not None:
+            records_fp.write(drop_seen_records(records_text, text, urls).encode("utf-8"))
+        ledger.record_done(
+            page, n_rows, hashlib.sha256(data).hexdigest(),
+            debug_offset=sync_output(debug_fp), records_offset=sync_output(records_fp),
+        )
+        index = get_dedup_index()
+        skipped = ""
+        if index is not None:
+            index.add_many([(u, page) for u in urls])
+            skipped = f" ({n_lines - len(urls)} already captured, skipped)" if n_lines > len(urls) else ""
+        records = f", records in {OUT_RECORDS_JSONL}" if records_fp is not None else ""
+        print(f"Page {page}: {n_rows} rows{skipped}, debug lines written (see {OUT_DEBUG_JSONL}{records}).")
+    else:
+        attempts = ledger.record_failure(page, status)
+        print(f"Page {page}: {status} (attempt {attempts}/{ledger.max_attempts}), will retry later.")
+    telemetry.finish(page, status, n_rows, write_ms=(time.perf_counter() - start) * 1000)
+
+
+class BatchCommitter:
+    """
+    批量提交 debug 行（捕获模式下还有记录文件）和台账：ok 页的内容先写进文件缓冲，攒够 max_pages 页或
+    距上次 fsync 超过 max_seconds 才 fsync 一次，再在一个事务里把这批页记为完成
+    （偏移取 fsync 之后的文件长度）。中途崩溃时没 fsync 的页不会被记为完成，
+    重启后由 open_debug_output / open_records_output 截掉并重抓。失败页不写文件，直接记账。
+    """
+
+    def __init__(self, ledger, debug_fp, max_pages=FSYNC_EVERY_PAGES, max_seconds=FSYNC_INTERVAL,
+                 records_fp=None):
+        self.ledger = ledger
+        self.debug_fp = debug_fp
+        self.records_fp = records_fp
+        self.max_pages = max_pages
+        self.max_seconds = max_seconds
+        self._pending = []
+        self._pending_urls = []
+        self._batch_seen = set()
+        self._skipped = 0
+        self._write_ms = {}
+        self._last_sync = time.monotonic()
+
+    def add(self, page, status, text, n_rows, records_text=""):
+        start = time.perf_counter()
+        if status == "ok":
+            n_lines = text.count("\n")
+            kept_text, urls = drop_seen_schools(text, self._batch_seen)
+            self._skipped += n_lines - len(urls) if get_dedup_index() is not None else 0
+            self._pending_urls.extend((u, page) for u in urls)
+            data = kept_text.encode("utf-8")
+            self.debug_fp.write(data)
+            if self.records_fp is not None:
+                self.records_fp.write(drop_seen_records(records_text, text, urls).encode("utf-8"))
+            self._pending.append((page, n_rows, hashlib.sha256(data).hexdigest()))
+            self._write_ms[page] = (time.perf_counter() - start) * 1000
+            if self.due():
+                self.flush()
+        else:
+            attempts = self.ledger.record_failure(page, status)
+            print(f"Page {page}: {status} (attempt {attempts}/{self.ledger.max_attempts}), will retry later.")
+            telemetry.finish(page, status, n_rows, write_ms=(time.perf_counter() - start) * 1000)
+
+    def due(self):
+        return len(self._pending) >= self.max_pages or (
+            self._pending and time.monotonic() - self._last_sync >= self.max_seconds
+        )
+
+    def flush(self):
+        self._last_sync = time.monotonic()
+        if not self._pending:
+            return
+        start = time.perf_counter()
+        self.ledger.record_done_many(
+            self._pending,
+            debug_offset=sync_output(self.debug_fp),
+            records_offset=sync_output(self.records_fp),
+        )
+        index = get_dedup_index()
+        if index is not None:
+            index.add_many(self._pending_urls)
+        pages = [p for p, _, _ in self._pending]
+        rows = sum(n for _, n, _ in self._pending)
+        # fsync 和记账是整批一次，耗时平摊到这批的每一页
+        sync_ms = (time.perf_counter() - start) * 1000 / len(pages)
+        for page, n_rows, _ in self._pending:
+            telemetry.finish(page, "ok", n_rows, write_ms=self._write_ms.pop(page, 0) + sync_ms)
+        skipped = f", {self._skipped} already captured" if self._skipped else ""
+        records = f" and {OUT_RECORDS_JSONL}" if self.records_fp is not None else ""
+        print(f"Committed {len(pages)} page(s) {pages[0]}..{pages[-1]} ({rows} rows{skipped}) "
+              f"to {OUT_DEBUG_JSONL}{records}.")
+        self._pending = []
+        self._pending_urls = []
+        self._batch_seen = set()
+        self._skipped = 0
+
+
+def print_run_summary(limiter):
+    print(f"Rate limiter: {limiter.summary()}")
+    print(f"Browser network: {network_log.summary()}")
+    if _dedup is not None:
+        print(f"Dedup index: {_dedup.summary()}")
+    print(f"Telemetry ({TELEMETRY_LOG}): {json.dumps(telemetry.summary(), ensure_ascii=False)}")
+
+
+def run_crawl_rounds(ledger, crawl_pages):
+    """
+    先抓一轮所有未完成的页，之后只重试失败/被拦截的页（按台账里的退避时间），
+    直到全部完成或达到重试上限。crawl_pages(pages) 负责抓取并 commit_page。
+    """
+    while True:
+        pages = ledger.pages_due()
+        if pages:
+            crawl_pages(pages)
+            continue
+        wait = ledger.seconds_until_next_retry()
+        if wait is None:
+            break
+        print(f"Waiting {wait:.0f}s before retrying failed pages...")
+        time.sleep(wait)
+
+    print(f"Crawl finished: {ledger.summary()}")
+
 
 def scrape_texas_elementary_schools():
+    ledger = open_ledger()
+    limiter = make_rate_limiter()
     driver = build_driver()
 
     try:
-        with open(OUT_DEBUG_JSONL, "a", encoding="utf-8") as debug_fp:
-            for page in range(START_PAGE, MAX_PAGES + 1):
-                _rows = get_page_data(page, driver, debug_fp=debug_fp)
+        with open_debug_output(ledger) as debug_fp, open_records_output(ledger) as records_fp:
+            run_crawl_rounds(
+                ledger,
+                lambda pages: crawl_pages_pipelined(pages, driver, limiter, ledger, debug_fp, records_fp),
+            )
+    finally:
+        driver.quit()
+        ledger.close()
+        print_run_summary(limiter)
+
+
+def crawl_pages_pipelined(pages, driver, limiter, ledger, debug_fp, records_fp=None):
+    """
+    单个浏览器的流水线：当前线程只管开页面（load_page），解析交给 PARSE_THREADS 个线程，
+    写入线程按页序批量提交。driver 打开第 N+1 页时，第 N 页正在解析/写入。
+    """
+    results = queue.Queue()
+    writer, writer_errors = start_ordered_writer(results, pages, ledger, debug_fp, records_fp)
+    # 解析跟不上时让浏览器等一等，避免整页 HTML 在内存里越堆越多
+    in_flight = threading.BoundedSemaphore(PARSE_THREADS * 2)
+
+    def parse(loaded):
+        try:
+            buf, records_buf = io.StringIO(), io.StringIO()
+            status, rows = finish_page(loaded, debug_fp=buf, limiter=limiter, records_fp=records_buf)
+            results.put((loaded["page"], status, buf.getvalue(), len(rows), records_buf.getvalue()))
+        finally:
+            in_flight.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=PARSE_THREADS, thread_name_prefix="parse") as parsers:
+            for page in pages:
+                if writer_errors:
+                    break  # 写不进去了，别再开新页面
+                loaded = load_page(page, driver, limiter=limiter)
+                in_flight.acquire()
+                parsers.submit(parse, loaded)
+    finally:
+        results.put(None)
+        writer.join()
+    if writer_errors:
+        raise writer_errors[0]
+
+
+def scrape_texas_elementary_schools_http():
+    """
+    HTTP 优先：每批 HTTP_CONCURRENCY 页并发抓取（连接复用、压缩），
+    被拦截或需要 JS 渲染的页面才交给 build_driver 启动的浏览器（按需启动，只启动一次）。
+    """
+    ledger = open_ledger()
+    limiter = make_rate_limiter()
+    fetcher = HttpFetcher(concurrency=HTTP_CONCURRENCY)
+    driver = None
+
+    try:
+        with open_debug_output(ledger) as debug_fp, open_records_output(ledger) as records_fp:
+            def crawl_pages(pages):
+                nonlocal driver
+                for i in range(0, len(pages), HTTP_CONCURRENCY):
+                    batch = pages[i:i + HTTP_CONCURRENCY]
+                    # 每个请求一个令牌；批内请求随后并发发出
+                    for _ in batch:
+                        limiter.acquire()
+                    results = fetcher.fetch_many([page_url(p) for p in batch])
+
+                    for page, result in zip(batch, results):
+                        print(f"--- [HTTP] page {page} -> {result['status']} ({result['reason']})")
+                        outcome = fetch_outcome(result)
+                        limiter.record(outcome, detail={"page": page, "via": "http"})
+                        telemetry.stage(page, "fetch_ms", result["elapsed_ms"])
+                        # 被拦截后由浏览器补抓成功的页也算一次拦截
+                        telemetry.note(page, bytes=result["bytes"], blocked=outcome == "blocked")
+                        buf, records_buf = io.StringIO(), io.StringIO()
+                        if result["needs_browser"]:
+                            if driver is None:
+                                driver = build_driver()
+                            status, rows = get_page_result(
+                                page, driver, debug_fp=buf, limiter=limiter, records_fp=records_buf)
+                        else:
+                            rows = parse_page_html(result["html"], page, debug_fp=buf)
+                            status = "ok" if rows else "empty"
+                        commit_page(ledger, debug_fp, page, status, buf.getvalue(), len(rows),
+                                    records_fp, records_buf.getvalue())
+
+            run_crawl_rounds(ledger, crawl_pages)
+    finally:
+        fetcher.close()
+        if driver is not None:
+            driver.quit()
+        ledger.close()
+        print_run_summary(limiter)
+
 
-                debug_fp.flush()
-                print(f"Page {page}: debug lines written (see {OUT_DEBUG_JSONL}).")
+def start_ordered_writer(results, pages, ledger, debug_fp, records_fp=None):
+    """
+    启动写入线程（write_pages_in_order），返回 (thread, errors)。
+    写入出错（例如磁盘写满）时异常放进 errors，线程退出；调用方应停止抓取，
+    join 之后重新抛出，不要让 run_crawl_rounds 把没记账的页再抓一轮。
+    """
+    errors = []
+
+    def run():
+        try:
+            write_pages_in_order(results, pages, ledger, debug_fp, records_fp)
+        except BaseException as e:
+            print(f"Writer thread failed: {type(e).__name__}: {e}")
+            errors.append(e)
 
-                time.sleep(random.uniform(3, 5))
+    writer = threading.Thread(target=run, name="ordered-writer")
+    writer.start()
+    return writer, errors
+
+
+def write_pages_in_order(results, pages, ledger, debug_fp, records_fp=None):
+    """
+    唯一的写入线程：各 worker 乱序交来 (page, status, debug_text, n_rows, records_text)，
+    按 pages 的顺序提交到 debug JSONL（捕获模式下还有记录文件）和台账，保证输出与顺序抓取时一致。
+    提交是批量的（BatchCommitter）：空闲超过 FSYNC_INTERVAL 秒也会把攒着的页落盘。
+    收到 None 表示所有 worker 已结束，剩余页按页码顺序提交。
+    """
+    committer = BatchCommitter(ledger, debug_fp, records_fp=records_fp)
+    pending = {}
+    order = iter(pages)
+    next_page = next(order, None)
+
+    while True:
+        try:
+            item = results.get(timeout=committer.max_seconds)
+        except queue.Empty:
+            committer.flush()
+            continue
+        if item is None:
+            break
+        page, *rest = item
+        pending[page] = rest
+        while next_page in pending:
+            committer.add(next_page, *pending.pop(next_page))
+            next_page = next(order, None)
+
+    for page in sorted(pending):
+        committer.add(page, *pending[page])
+    committer.flush()
+
+
+def scrape_texas_elementary_schools_parallel(num_workers=NUM_WORKERS):
+    ledger = open_ledger()
+    # 所有 worker 共用一个限速器：全局礼貌预算随站点反馈自适应
+    limiter = make_rate_limiter()
+    try:
+        with open_debug_output(ledger) as debug_fp, open_records_output(ledger) as records_fp:
+            run_crawl_rounds(
+                ledger,
+                lambda pages: crawl_pages_parallel(pages, num_workers, limiter, ledger, debug_fp, records_fp),
+            )
+    finally:
+        ledger.close()
+        print_run_summary(limiter)
+
+
+def crawl_pages_parallel(pages, num_workers, limiter, ledger, debug_fp, records_fp=None):
+    page_queue = queue.Queue()
+    for page in pages:
+        page_queue.put(page)
+
+    results = queue.Queue()
+    writer, writer_errors = start_ordered_writer(results, pages, ledger, debug_fp, records_fp)
+
+    def worker(worker_id):
+        try:
+            driver = build_driver()
+        except Exception as e:
+            # 没能启动浏览器的 worker 直接退出，页面留给其它 worker
+            print(f"[worker {worker_id}] failed to start driver: {e}")
+            return
+        try:
+            while not writer_errors:
+                try:
+                    page = page_queue.get_nowait()
+                except queue.Empty:
+                    return
+                # 每页的 debug 行（和捕获的记录）先写进内存缓冲，由写入线程按页序落盘
+                buf, records_buf = io.StringIO(), io.StringIO()
+                status, rows = get_page_result(
+                    page, driver, debug_fp=buf, limiter=limiter, records_fp=records_buf)
+                results.put((page, status, buf.getvalue(), len(rows), records_buf.getvalue()))
+        finally:
+            driver.quit()
+
+    workers = [
+        threading.Thread(target=worker, args=(i,), name=f"scrape-worker-{i}")
+        for i in range(num_workers)
+    ]
+    try:
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+    finally:
+        results.put(None)
+        writer.join()
+    if writer_errors:
+        raise writer_errors[0]
+
+    if not page_queue.empty():
+        # 没有可用的浏览器：剩下的页保持未完成状态，下次运行时再抓
+        print(f"⚠️ {page_queue.qsize()} page(s) were not scraped (no working driver).")
+        raise RuntimeError("no working driver")
+
+
+def open_worker_output(work_queue, path):
+    """
+    打开本 worker 的输出文件。同一个 WORKER_ID 重启时，把上次没提交的尾巴截掉
+    （已提交的偏移记在队列库里；还没有任何一页提交过时按 0 处理，整个文件都是没提交的）。
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    committed = dict(work_queue.outputs()).get(path, 0)
+    if os.path.exists(path) and os.path.getsize(path) > committed:
+        print(f"Truncating {os.path.getsize(path) - committed} uncommitted byte(s) from {path}.")
+        with open(path, "r+b") as f:
+            f.truncate(committed)
+    return open(path, "ab")
+
+
+def scrape_texas_elementary_schools_worker(queue_db=WORK_QUEUE_DB, worker_id=WORKER_ID):
+    """
+    队列 worker：可以在多个进程 / 多台机器上同时运行同一份代码。
+    每页先写进自己的输出文件并 fsync，再在一个事务里提交页状态和文件偏移；
+    提交时租约已丢（被判定为死掉、页面已转给别人）就把刚写的内容截掉，保证不重复。
+    去重索引是单机 SQLite（WAL），这个模式下不用；合并后的文件里每页只出现一次。
+    """
+    work_queue = WorkQueue(
+        queue_db,
+        max_attempts=MAX_PAGE_ATTEMPTS,
+        backoff_base=RETRY_BACKOFF[0],
+        backoff_cap=RETRY_BACKOFF[1],
+    )
+    # 谁先启动谁发布；已发布的页不会重复插入
+    work_queue.publish(range(START_PAGE, MAX_PAGES + 1))
+    out_path = os.path.join(WORKER_OUTPUT_DIR, f"{worker_id}.jsonl")
+    records_path = os.path.join(WORKER_OUTPUT_DIR, f"{worker_id}.records.jsonl") if CAPTURE_JSON else None
+    limiter = make_rate_limiter()
+    driver = build_driver()
+    pages_done = 0
+
+    try:
+        with open_worker_output(work_queue, out_path) as out_fp, \
+                (open_worker_output(work_queue, records_path) if records_path
+                 else contextlib.nullcontext()) as records_fp:
+            while True:
+                page = work_queue.claim(worker_id, LEASE_SECONDS)
+                if page is None:
+                    wait = work_queue.seconds_until_next_task()
+                    if wait is None:
+                        break
+                    # 其它 worker 手上的页还没完成：等它们完成或租约过期
+                    time.sleep(min(max(wait, 1.0), LEASE_SECONDS / 3))
+                    continue
+
+                with LeaseKeeper(work_queue, worker_id, page, LEASE_SECONDS) as lease:
+                    buf, records_buf = io.StringIO(), io.StringIO()
+                    status, rows = get_page_result(
+                        page, driver, debug_fp=buf, limiter=limiter, records_fp=records_buf)
+
+                write_start = time.perf_counter()
+                start = out_fp.tell()
+                records_start = records_fp.tell() if records_fp is not None else None
+                if status == "ok" and not lease.lost:
+                    out_fp.write(buf.getvalue().encode("utf-8"))
+                    if records_fp is not None:
+                        records_fp.write(records_buf.getvalue().encode("utf-8"))
+                if lease.lost or not work_queue.complete(
+                    worker_id, page, status, len(rows), out_path, sync_output(out_fp),
+                    records_path, sync_output(records_fp),
+                ):
+                    print(f"[{worker_id}] lost the lease on page {page}; discarding its output.")
+                    out_fp.truncate(start)
+                    if records_fp is not None:
+                        records_fp.truncate(records_start)
+                    telemetry.finish(page, "lost_lease", 0)
+                    continue
+                telemetry.finish(page, status, len(rows), write_ms=(time.perf_counter() - write_start) * 1000)
+                pages_done += 1
+                print(f"[{worker_id}] page {page}: {status}, {len(rows)} rows")
     finally:
         driver.quit()
+        print(f"[{worker_id}] finished {pages_done} page(s). Queue: {work_queue.summary()}")
+        work_queue.close()
+        print_run_summary(limiter)
 
 
 if __name__ == "__main__":
-    scrape_texas_elementary_schools()
+    if REFRESH_TAG:
+        print(f"Refresh crawl {REFRESH_TAG}: dedup off, ledger {LEDGER_DB}, output {OUT_DEBUG_JSONL}")
+        print(f"If interrupted, resume with SCRAPER_REFRESH={REFRESH_TAG}")
+        print(f"Afterwards run: python change_detect.py {OUT_DEBUG_JSONL}")
+    if WORK_QUEUE_DB:
+        scrape_texas_elementary_schools_worker()
+    elif FETCH_MODE == "http":
+        scrape_texas_elementary_schools_http()
+    elif NUM_WORKERS > 1:
+        scrape_texas_elementary_schools_parallel(NUM_WORKERS)
+    else:
+        scrape_texas_elementary_schools()
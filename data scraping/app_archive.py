@@ -1,19 +1,32 @@
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 import pandas as pd
-import time
+import os
 
+from http_fetch import HttpFetcher, fetch_outcome
+from rate_limiter import AdaptiveRateLimiter
+from page_ready import wait_for_page_ready
+from dedup_index import normalize_school_url
 
-BASE_URL = "https://www.usnews.com/education/k12/elementary-schools/texas"
+
+# Can be pointed at a local stand-in site (see fixture_server.py)
+BASE_URL = os.environ.get(
+    "SCRAPER_BASE_URL", "https://www.usnews.com/education/k12/elementary-schools/texas"
+)
 EXPECTED_TOTAL = 6603  # target number of schools (for an early stop)
 
+# "http": fetch HTML with a pooled HTTP client and only fall back to Chrome for
+# blocked / JS-only pages; "browser": always drive Chrome
+FETCH_MODE = "http"
+
+# Request pacing: an adaptive token bucket that speeds up slowly while pages
+# come back fine and halves its rate (with a cooldown) on blocks/errors
+RATE_LOG = "rate_decisions.jsonl"
+
 
 def extract_schools_from_soup(soup):
     """
-    Extract school names from the rankings results section (#results).
+    Extract (school name, profile URL) pairs from the rankings results section (#results).
     Rank is implied by order; we do NOT try to parse text like
     'in Texas Elementary Schools' because that isn't present on this page.
     """
@@ -36,7 +49,7 @@ def extract_schools_from_soup(soup):
         # Skip very short or obviously non-school labels if any
         if len(name) < 3:
             continue
-        schools.append(name)
+        schools.append((name, a["href"]))
 
     return schools
 
@@ -46,14 +59,20 @@ def scrape_texas_elementary_schools():
     Scrape all Texas elementary school rankings from US News using simple
     ?page=N pagination and DOM parsing of the #results section.
     """
-    options = webdriver.ChromeOptions()
-    options.add_argument("--start-maximized")
-    # options.add_argument("--headless")
+    def build_driver():
+        options = webdriver.ChromeOptions()
+        options.add_argument("--start-maximized")
+        # options.add_argument("--headless")
+        return webdriver.Chrome(options=options)
 
-    driver = webdriver.Chrome(options=options)
+    # The browser is only started once a page actually needs it
+    driver = None
+    fetcher = HttpFetcher(concurrency=1) if FETCH_MODE == "http" else None
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, max_rate=2.0, log_path=RATE_LOG)
 
     all_rows = []
-    seen_names = set()
+    # Keyed on the normalized profile URL: different schools can share a name
+    seen_urls = set()
 
     try:
         current_page = 1
@@ -62,33 +81,50 @@ def scrape_texas_elementary_schools():
         while current_page <= max_pages:
             url = f"{BASE_URL}?page={current_page}#results"
             print(f"\n=== Loading page {current_page}: {url}")
-            driver.get(url)
-
-            # Wait for the results section or at least some headings to appear
-            try:
-                WebDriverWait(driver, 15).until(
-                    EC.presence_of_element_located(
-                        (By.CSS_SELECTOR, "#results, h2, h3")
-                    )
-                )
-            except Exception:
-                print(f"Page {current_page}: timeout waiting for content, stopping.")
-                break
-
-            time.sleep(1)  # give JS a bit more time
-
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-            page_school_names = extract_schools_from_soup(soup)
 
-            # De-duplicate by school name across all pages
+            limiter.acquire()
+            html = None
+            if fetcher:
+                result = fetcher.fetch(url)
+                print(f"HTTP {result['status']} ({result['reason']})")
+                limiter.record(fetch_outcome(result), detail={"page": current_page, "via": "http"})
+                if not result["needs_browser"]:
+                    html = result["html"]
+
+            if html is None:
+                if driver is None:
+                    driver = build_driver()
+                driver.get(url)
+
+                # Parse as soon as the result cards are in the DOM and it has
+                # stopped changing, instead of a fixed extra sleep
+                ready = wait_for_page_ready(driver, expected_cards=10, timeout=15)
+                if ready["state"] == "blocked":
+                    limiter.record("blocked", detail={"page": current_page, "via": "browser"})
+                    print(f"Page {current_page}: blocked ({driver.title}), stopping.")
+                    break
+                if ready["cards"] == 0:
+                    limiter.record("timeout", detail={"page": current_page, "via": "browser"})
+                    print(f"Page {current_page}: timeout waiting for content, stopping.")
+                    break
+
+                html = driver.page_source
+                limiter.record("ok", detail={"page": current_page, "via": "browser"})
+
+            soup = BeautifulSoup(html, "html.parser")
+            page_schools = extract_schools_from_soup(soup)
+
+            # De-duplicate by school URL across all pages (the name link comes
+            # before "Read More" in each card, so the first hit carries the name)
             unique_this_page = []
-            for name in page_school_names:
-                if name not in seen_names:
-                    seen_names.add(name)
-                    unique_this_page.append(name)
+            for name, href in page_schools:
+                url = normalize_school_url(href)
+                if url not in seen_urls:
+                    seen_urls.add(url)
+                    unique_this_page.append((name, url))
 
             print(
-                f"Page {current_page}: found {len(page_school_names)} names, "
+                f"Page {current_page}: found {len(page_schools)} links, "
                 f"{len(unique_this_page)} new unique."
             )
 
@@ -98,16 +134,15 @@ def scrape_texas_elementary_schools():
                 break
 
             # Assign ranks purely by order across all pages
-            for name in unique_this_page:
+            for name, url in unique_this_page:
                 rank = len(all_rows) + 1
-                all_rows.append({"rank": rank, "school_name": name})
+                all_rows.append({"rank": rank, "school_name": name, "school_url": url})
 
             if len(all_rows) >= EXPECTED_TOTAL:
                 print(f"Reached {EXPECTED_TOTAL} schools; stopping early.")
                 break
 
             current_page += 1
-            time.sleep(0.5)  # be polite
 
         print(f"\nTotal unique schools collected: {len(all_rows)}")
 
@@ -118,7 +153,7 @@ def scrape_texas_elementary_schools():
         df = pd.DataFrame(all_rows)
         df["rank_int"] = pd.to_numeric(df["rank"], errors="coerce")
         df = df.sort_values("rank_int").reset_index(drop=True)
-        df = df[["rank", "school_name"]]
+        df = df[["rank", "school_name", "school_url"]]
 
         output_file = "texas_elementary_schools_rankings.csv"
         df.to_csv(output_file, index=False, encoding="utf-8")
@@ -133,9 +168,13 @@ def scrape_texas_elementary_schools():
         return df
 
     finally:
-        input("\nPress Enter to close the browser...")
-        driver.quit()
-        print("Browser closed")
+        print(f"Rate limiter: {limiter.summary()}")
+        if fetcher:
+            fetcher.close()
+        if driver is not None:
+            input("\nPress Enter to close the browser...")
+            driver.quit()
+            print("Browser closed")
 
 
 if __name__ == "__main__":
@@ -3,23 +3,66 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+import csv
+import os
 import time
 import pandas as pd
 from bs4 import BeautifulSoup
 
+
+CSV_COLUMNS = [
+    'School Name', 'Rank', 'Location', 'District',
+    'Grade Level', 'Enrollment', 'Student-Teacher Ratio',
+]
+
+# Collects [card id, outerHTML] for result cards not yet marked data-scraped,
+# giving each a data-card-id so it can be marked once it has been parsed.
+# Containers are found the same way scrape_schools always did: nearest li,
+# then article, then div around each school link.
+NEW_CARDS_SCRIPT = """
+const links = document.querySelectorAll('a[href*="/education/k12/texas/"]');
+const fresh = [];
+const seen = new Set();
+window.__nextCardId = window.__nextCardId || 0;
+for (const link of links) {
+    const card = link.closest('li') || link.closest('article') || link.closest('div');
+    if (!card || card.hasAttribute('data-scraped') || seen.has(card)) continue;
+    seen.add(card);
+    if (!card.hasAttribute('data-card-id')) {
+        card.setAttribute('data-card-id', String(window.__nextCardId++));
+    }
+    fresh.push([card.getAttribute('data-card-id'), card.outerHTML]);
+}
+return fresh;
+"""
+
+# Marks the given cards as parsed. Cards that were not complete yet (still
+# rendering, no school name or rank) stay unmarked and are offered again next time.
+MARK_SCRAPED_SCRIPT = """
+for (const id of arguments[0]) {
+    const card = document.querySelector('[data-card-id="' + id + '"]');
+    if (card) card.setAttribute('data-scraped', '1');
+}
+"""
+
 class SchoolRankingScraper:
-    def __init__(self, url, num_clicks=5):
+    def __init__(self, url, num_clicks=5, output_file='texas_elementary_schools.csv'):
         """
         Initialize the scraper
         
         Args:
             url: The URL to scrape
             num_clicks: Number of times to click "Load More" button
+            output_file: CSV that rows are streamed to as soon as they are parsed
         """
         self.url = url
         self.num_clicks = num_clicks
+        self.output_file = output_file
         self.driver = None
-        self.schools_data = []
+        self.seen_schools = set()
+        self.scraped_count = 0
+        self._out = None
+        self._writer = None
         
     def setup_driver(self):
         """Setup Chrome WebDriver with options"""
@@ -52,11 +95,15 @@ class SchoolRankingScraper:
                 
                 # Click the button
                 load_more_button.click()
-                print(f"Click {i+1}/{self.num_clicks} completed")
                 
                 # Wait 2 seconds to avoid ban
                 time.sleep(2)
                 
+                # Parse only the cards this click appended and write them out now
+                new_rows = self.scrape_new_cards()
+                print(f"Click {i+1}/{self.num_clicks} completed: {new_rows} new schools "
+                      f"({self.scraped_count} total)")
+                
             except TimeoutException:
                 print(f"Load More button not found after {i} clicks. May have reached the end.")
                 break
@@ -67,24 +114,79 @@ class SchoolRankingScraper:
         print("Finished clicking Load More button")
         time.sleep(2)  # Final wait for content to load
         
+    def open_output(self):
+        """
+        Start a fresh CSV and write the header; rows are appended as they are parsed
+        """
+        self._out = open(self.output_file, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._out, fieldnames=CSV_COLUMNS, restval='')
+        self._writer.writeheader()
+        self._out.flush()
+
+    def close_output(self):
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+            self._writer = None
+
+    def scrape_new_cards(self):
+        """
+        Parse the cards appended since the last call and stream them to the CSV.
+        Only the new cards' HTML leaves the browser, so each click costs the same
+        no matter how long the list has grown.
+        
+        Returns:
+            Number of new schools written
+        """
+        fragments = self.driver.execute_script(NEW_CARDS_SCRIPT) or []
+        rows = []
+        parsed_ids = []
+        for card_id, html in fragments:
+            soup = BeautifulSoup(html, 'html.parser')
+            # A card without its name heading has not finished rendering;
+            # leave it unmarked so a later call picks it up complete
+            heading = soup.find('h3')
+            if heading is None:
+                continue
+            card_rows = self.extract_schools(soup)
+            # Same for a card whose rank is not there yet (no row, school not seen)
+            if not card_rows and heading.get_text(strip=True) not in self.seen_schools:
+                continue
+            rows.extend(card_rows)
+            parsed_ids.append(card_id)
+        if parsed_ids:
+            self.driver.execute_script(MARK_SCRAPED_SCRIPT, parsed_ids)
+        
+        if rows and self._writer is not None:
+            self._writer.writerows(rows)
+            # Flush per batch so a crash keeps everything parsed so far
+            self._out.flush()
+            os.fsync(self._out.fileno())
+        self.scraped_count += len(rows)
+        return len(rows)
+
     def scrape_schools(self):
         """
-        Scrape school data from the loaded page
+        Scrape whatever cards on the loaded page have not been parsed yet
         """
         print("Starting to scrape school data...")
+        new_rows = self.scrape_new_cards()
+        print(f"Scraped {new_rows} new schools ({self.scraped_count} total)")
+
+    def extract_schools(self, soup):
+        """
+        Extract school rows from a soup (a whole page or a single card)
         
-        # Get page source and parse with BeautifulSoup
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-        
-        # Find all school entries - they're typically in article or div elements
-        # Based on the page structure, schools are in a specific container
-        school_elements = soup.find_all('article') or soup.find_all('div', class_=lambda x: x and 'school' in x.lower())
+        Returns:
+            List of dicts keyed by CSV_COLUMNS, skipping schools already seen
+        """
+        schools = []
         
-        # Alternative: Find by links that contain school names
+        # Find by links that contain school names
         school_links = soup.find_all('a', href=lambda x: x and '/education/k12/texas/' in x if x else False)
         
-        # Extract unique schools
-        seen_schools = set()
+        # Extract unique schools (across all calls)
+        seen_schools = self.seen_schools
         
         for link in school_links:
             # Get the school container (parent elements)
@@ -101,7 +203,6 @@ class SchoolRankingScraper:
                     # Skip if already processed
                     if school_name in seen_schools:
                         continue
-                    seen_schools.add(school_name)
                     
                     school_data['School Name'] = school_name
                     
@@ -166,18 +267,21 @@ class SchoolRankingScraper:
                     
                     # Only add if we have at least school name and rank
                     if 'School Name' in school_data and school_data.get('Rank') != 'N/A':
-                        self.schools_data.append(school_data)
+                        # Only accepted schools count as seen, so a card whose rank
+                        # had not rendered yet is picked up on a later pass
+                        seen_schools.add(school_name)
+                        schools.append(school_data)
         
-        print(f"Scraped {len(self.schools_data)} schools")
+        return schools
         
-    def save_to_csv(self, filename='texas_elementary_schools.csv'):
+    def save_to_csv(self):
         """
-        Save scraped data to CSV file
+        Close the streamed CSV and load its first rows back for the summary
         """
-        if self.schools_data:
-            df = pd.DataFrame(self.schools_data)
-            df.to_csv(filename, index=False, encoding='utf-8')
-            print(f"Data saved to {filename}")
+        self.close_output()
+        if self.scraped_count:
+            df = pd.read_csv(self.output_file, nrows=5)
+            print(f"Data saved to {self.output_file}")
             return df
         else:
             print("No data to save")
@@ -189,7 +293,11 @@ class SchoolRankingScraper:
         """
         try:
             self.setup_driver()
+            self.open_output()
+            # Cards shown before the first click
+            self.scrape_schools()
             self.click_load_more()
+            # Anything that finished rendering after the last click
             self.scrape_schools()
             df = self.save_to_csv()
             
@@ -198,7 +306,7 @@ class SchoolRankingScraper:
                 print("\n" + "="*50)
                 print("SCRAPING SUMMARY")
                 print("="*50)
-                print(f"Total schools scraped: {len(df)}")
+                print(f"Total schools scraped: {self.scraped_count}")
                 print("\nFirst 5 schools:")
                 print(df.head().to_string())
                 print("\n" + "="*50)
@@ -206,6 +314,7 @@ class SchoolRankingScraper:
         except Exception as e:
             print(f"An error occurred: {e}")
         finally:
+            self.close_output()
             if self.driver:
                 self.driver.quit()
                 print("Browser closed")
@@ -213,8 +322,10 @@ class SchoolRankingScraper:
 
 # Usage example
 if __name__ == "__main__":
-    # Configuration
-    URL = "https://www.usnews.com/education/k12/elementary-schools/texas"
+    # Configuration (SCRAPER_BASE_URL can point at a local stand-in site, see fixture_server.py)
+    URL = os.environ.get(
+        "SCRAPER_BASE_URL", "https://www.usnews.com/education/k12/elementary-schools/texas"
+    )
     NUM_CLICKS = 3  # User can set how many times to click Load More
     
     # Create scraper and run
@@ -1,3 +1,6 @@
+import io
+import os
+
 import pandas as pd
 
 INPUT_JSONL = "converted_test.jsonl"
@@ -55,5 +58,36 @@ def jsonl_to_csv(input_path: str, output_path: str, chunksize: int = 0) -> None:
         df.to_csv(output_path, index=False, encoding="utf-8")
 
 
+def update_csv(input_path: str, output_path: str, pages) -> int:
+    """
+    增量更新：CSV 里 source_page 属于 pages 的行整体换成 input_path 里的记录，其它页的行原样保留
+    （按字符串读写，不改变已有行的格式）。CSV 还不存在时直接导出。返回更新后的总行数。
+    """
+    new = pd.DataFrame()
+    if os.path.getsize(input_path) > 0:
+        # 先按全量导出的方式转成 CSV 文本，再按字符串读回来，和旧行同样的格式
+        buf = io.StringIO()
+        flatten_df(pd.read_json(input_path, lines=True)).to_csv(buf, index=False)
+        buf.seek(0)
+        new = pd.read_csv(buf, dtype=str, keep_default_na=False)
+
+    if os.path.exists(output_path):
+        old = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+        changed = {str(p) for p in pages}
+        old = old[~old["source_page"].isin(changed)]
+        df = pd.concat([old, new], ignore_index=True).fillna("")
+    else:
+        df = new
+    if "source_page" in df.columns:
+        df = df.sort_values(
+            "source_page", key=lambda s: pd.to_numeric(s, errors="coerce"), kind="stable"
+        )
+
+    tmp = output_path + ".tmp"
+    df.to_csv(tmp, index=False, encoding="utf-8")
+    os.replace(tmp, output_path)
+    return len(df)
+
+
 if __name__ == "__main__":
     jsonl_to_csv(INPUT_JSONL, OUTPUT_CSV, CHUNKSIZE)
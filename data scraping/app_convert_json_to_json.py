@@ -1,6 +1,15 @@
+import argparse
 import json
+import os
 import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+
+# 并行模式：输入按 CHUNK_LINES 行一块分给进程池，块内解析 + 标准化都在子进程里做
+CHUNK_LINES = 20_000
 
 def normalize_school(item: dict) -> dict:
     if not isinstance(item, dict):
@@ -72,6 +81,13 @@ def normalize_school(item: dict) -> dict:
     elif ratio:
         ratio_parsed = {"raw": str(ratio)}
 
+    # Detail page URL (used by enrich_details.py)
+    href = item.get("href")
+    if isinstance(href, str) and href.startswith("/"):
+        school_url = "https://www.usnews.com" + href
+    else:
+        school_url = href if isinstance(href, str) and href else None
+
     # Enrollment parse
     if isinstance(enrollment, str) and enrollment.isdigit():
         enrollment_val = int(enrollment)
@@ -90,6 +106,7 @@ def normalize_school(item: dict) -> dict:
         "source_meta": {
             "page": item.get("page"),
             "raw_school_name": item.get("school_name"),
+            "school_url": school_url,
         },
     }
 
@@ -132,12 +149,220 @@ def write_records(records: list[dict], out_path: str) -> None:
             json.dump(records, f, ensure_ascii=False, indent=2)
 
 
-def main(in_path: str = "test.jsonl", out_path: str = "converted_test.jsonl"):
-    data = load_records(in_path)
-    converted = normalize_all(data)
-    write_records(converted, out_path)
-    print(f"Wrote {out_path} ({len(converted)} records)")
+# ----------------------------
+# 流式版本：读一条、标准化一条、写一条，内存占用与输入大小无关
+# ----------------------------
+def iter_records(in_path: str, skipped: Optional[list] = None) -> Iterator[dict]:
+    """
+    逐条产出输入记录。JSONL 按行流式读取，坏行（不是合法 JSON，或不是对象）打印出来并跳过，
+    (行号, 原因) 记进 skipped；整体是一个 JSON 数组的文件只能整份读入后再逐条产出。
+    """
+    p = Path(in_path)
+    if p.suffix.lower() not in {".jsonl", ".ndjson"}:
+        yield from load_records(in_path)
+        return
+    with p.open("r", encoding="utf-8") as f:
+        for ln, line in enumerate(f, start=1):
+            obj, error = parse_line(line)
+            if error is not None:
+                print(f"Skipping line {ln} of {p}: {error}")
+                if skipped is not None:
+                    skipped.append((ln, error))
+            elif obj is not None:
+                yield obj
+
+
+def parse_line(line: str):
+    """一行 JSONL -> (对象, None)；空行 -> (None, None)；坏行 -> (None, 原因)。"""
+    line = line.strip()
+    if not line:
+        return None, None
+    try:
+        obj = json.loads(line)
+    except json.JSONDecodeError as e:
+        return None, f"invalid JSON ({e.msg} at column {e.colno})"
+    if not isinstance(obj, dict):
+        return None, f"expected a JSON object, got {type(obj).__name__}"
+    return obj, None
+
+
+def normalize_record(item):
+    """
+    标准化一条记录 -> (结果, None)；记录本身有问题时 -> (None, 原因)：
+    不是对象，或字段类型不对（例如 raw_text_list 是 null、里面混着非字符串）导致解析出错。
+    """
+    try:
+        return normalize_school(item), None
+    except Exception as e:
+        return None, f"cannot normalize record ({type(e).__name__}: {e})"
+
+
+def normalize_line(line: str):
+    """一行 JSONL -> (标准化结果, None)；空行 -> (None, None)；坏行 / 坏记录 -> (None, 原因)。"""
+    obj, error = parse_line(line)
+    if error is not None or obj is None:
+        return None, error
+    return normalize_record(obj)
+
+
+def iter_normalized(records: Iterable, skipped: Optional[list] = None) -> Iterator[dict]:
+    """逐条标准化；标准化不了的记录（不是对象、字段类型不对）打印出来并跳过。"""
+    for i, item in enumerate(records, start=1):
+        record, error = normalize_record(item)
+        if error is not None:
+            print(f"Skipping record {i}: {error}")
+            if skipped is not None:
+                skipped.append((i, error))
+        else:
+            yield record
+
+
+def iter_normalized_file(in_path: str, skipped: Optional[list] = None) -> Iterator[dict]:
+    """
+    读入 + 标准化的流式管道。JSONL 逐行处理，坏行和标准化失败的记录都按行号报告并跳过；
+    JSON 数组文件按记录序号报告。
+    """
+    p = Path(in_path)
+    if p.suffix.lower() not in {".jsonl", ".ndjson"}:
+        yield from iter_normalized(iter_records(in_path, skipped), skipped)
+        return
+    with p.open("r", encoding="utf-8") as f:
+        for ln, line in enumerate(f, start=1):
+            record, error = normalize_line(line)
+            if error is not None:
+                print(f"Skipping line {ln} of {p}: {error}")
+                if skipped is not None:
+                    skipped.append((ln, error))
+            elif record is not None:
+                yield record
+
+
+def write_records_stream(records: Iterable[dict], out_path: str) -> int:
+    """边产出边写；.json 输出也是逐条写进数组。返回写出的条数。"""
+    p = Path(out_path)
+    n = 0
+    with p.open("w", encoding="utf-8") as f:
+        if p.suffix.lower() in {".jsonl", ".ndjson"}:
+            for r in records:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+                n += 1
+        else:
+            f.write("[")
+            for r in records:
+                # 和 json.dump(records, indent=2) 的输出逐字节一致
+                item = json.dumps(r, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+                f.write((",\n  " if n else "\n  ") + item)
+                n += 1
+            f.write("\n]" if n else "]")
+    return n
+
+
+# ----------------------------
+# 并行版本：多进程分块标准化，按原顺序写出
+# ----------------------------
+def iter_chunks(in_path: str, chunk_lines: int = CHUNK_LINES) -> Iterator[tuple]:
+    """把 JSONL 切成 (块序号, 首行行号, [行, ...])，一次只在内存里放一块。"""
+    with open(in_path, "r", encoding="utf-8") as f:
+        index, first_ln, lines = 0, 1, []
+        for ln, line in enumerate(f, start=1):
+            lines.append(line)
+            if len(lines) >= chunk_lines:
+                yield index, first_ln, lines
+                index, first_ln, lines = index + 1, ln + 1, []
+        if lines:
+            yield index, first_ln, lines
+
+
+def normalize_chunk(chunk: tuple) -> tuple:
+    """子进程里跑：解析并标准化一块，返回 (块序号, 输出文本, 条数, [(行号, 原因), ...])。"""
+    index, first_ln, lines = chunk
+    out, skipped = [], []
+    for ln, line in enumerate(lines, start=first_ln):
+        # 坏记录只跳过这一行，不能让异常把整个进程池带崩
+        record, error = normalize_line(line)
+        if error is not None:
+            skipped.append((ln, error))
+        elif record is not None:
+            out.append(json.dumps(record, ensure_ascii=False) + "\n")
+    return index, "".join(out), len(out), skipped
+
+
+def normalize_parallel(in_path: str, out_path: str, workers: Optional[int] = None,
+                       chunk_lines: int = CHUNK_LINES, skipped: Optional[list] = None) -> int:
+    """
+    JSONL -> JSONL 的多进程标准化。块按完成先后回来，放进重排缓冲区，
+    按块序号依次写出，所以输出顺序和输入一致；同时在路上的块最多 workers * 2 个，
+    内存占用只和块大小、进程数有关。返回写出的条数。
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    chunks = iter_chunks(in_path, chunk_lines)
+    reorder = {}  # 块序号 -> (文本, 条数, 坏行)，等前面的块写完
+    next_index = 0
+    n = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(out_path, "w", encoding="utf-8") as out:
+        in_flight = set()
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < max_in_flight:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    in_flight.add(pool.submit(normalize_chunk, chunk))
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, text, count, bad = future.result()
+                reorder[index] = (text, count, bad)
+            while next_index in reorder:
+                text, count, bad = reorder.pop(next_index)
+                for ln, error in bad:
+                    print(f"Skipping line {ln} of {in_path}: {error}")
+                if skipped is not None:
+                    skipped.extend(bad)
+                out.write(text)
+                n += count
+                next_index += 1
+    return n
+
+
+def main(in_path: str = "test.jsonl", out_path: str = "converted_test.jsonl",
+         workers: int = 1, chunk_lines: int = CHUNK_LINES):
+    """
+    workers=1 单进程流式处理；>1（或 0 表示所有核）时多进程分块处理，
+    只支持 JSONL 输入和输出，其它格式照常走单进程。
+    """
+    skipped = []
+    start = time.perf_counter()
+    jsonl = {".jsonl", ".ndjson"}
+    if workers != 1 and Path(in_path).suffix.lower() in jsonl and Path(out_path).suffix.lower() in jsonl:
+        workers = workers or os.cpu_count() or 1
+        n = normalize_parallel(in_path, out_path, workers, chunk_lines, skipped)
+    else:
+        workers = 1
+        n = write_records_stream(iter_normalized_file(in_path, skipped), out_path)
+    elapsed = time.perf_counter() - start
+
+    note = f", {len(skipped)} malformed record(s) skipped" if skipped else ""
+    print(f"Wrote {out_path} ({n} records{note})")
+    mb = os.path.getsize(in_path) / 1e6
+    print(f"Normalized {n} records in {elapsed:.2f}s with {workers} process(es): "
+          f"{n / elapsed if elapsed else 0:,.0f} records/s, {mb / elapsed if elapsed else 0:.1f} MB/s")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Normalize raw card records (JSONL/JSON) into structured records.")
+    parser.add_argument("in_path", nargs="?", default="test.jsonl")
+    parser.add_argument("out_path", nargs="?", default="converted_test.jsonl")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes; 0 = all cores, 1 = single-process streaming (default)")
+    parser.add_argument("--chunk-lines", type=int, default=CHUNK_LINES,
+                        help="input lines per work unit in parallel mode")
+    args = parser.parse_args()
+    if args.workers < 0:
+        parser.error("--workers must be 0 (all cores) or a positive number")
+    if args.chunk_lines < 1:
+        parser.error("--chunk-lines must be a positive number")
+    main(args.in_path, args.out_path, args.workers, args.chunk_lines)
@@ -1,14 +1,30 @@
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 import pandas as pd
-import time
+import os
 
-BASE_URL = "https://www.usnews.com/education/k12/elementary-schools/texas"
+from http_fetch import HttpFetcher, fetch_outcome
+from rate_limiter import AdaptiveRateLimiter
+from driver_pool import DriverPool
+from page_ready import wait_for_page_ready
+
+# 可用环境变量指向本地替身站点（见 fixture_server.py）
+BASE_URL = os.environ.get(
+    "SCRAPER_BASE_URL", "https://www.usnews.com/education/k12/elementary-schools/texas"
+)
 EXPECTED_TOTAL = 6603
 
+# "http"：先用 HTTP 客户端取 HTML，被拦截/纯 JS 的页面才启动 Chrome；"browser"：每页都开 Chrome
+FETCH_MODE = "http"
+
+# 自适应限速：正常时慢慢提速，被拦截/出错时减半并冷却（调速记录写到 RATE_LOG）
+RATE_LOG = "rate_decisions.jsonl"
+limiter = AdaptiveRateLimiter(initial_rate=0.5, max_rate=1.0, log_path=RATE_LOG)
+
+# 浏览器池：Chrome 启动一次反复用，每用满 DRIVER_MAX_PAGES 页或内存超过 DRIVER_MAX_MEMORY_MB 就重开
+DRIVER_MAX_PAGES = 100
+DRIVER_MAX_MEMORY_MB = 1500
+
 def extract_schools_from_soup(soup):
     results_section = soup.find(id="results")
     if not results_section:
@@ -28,7 +44,7 @@ def extract_schools_from_soup(soup):
             schools.append(name)
     return schools
 
-def get_page_data(page_number):
+def build_driver():
     options = webdriver.ChromeOptions()
     options.add_argument("--start-maximized")
     
@@ -46,27 +62,33 @@ def get_page_data(page_number):
     
     # 移除 uBlock 相关代码，因为不稳定
     
-    driver = webdriver.Chrome(options=options)
+    return webdriver.Chrome(options=options)
+
+
+driver_pool = DriverPool(
+    build_driver, size=1, max_pages=DRIVER_MAX_PAGES, max_memory_mb=DRIVER_MAX_MEMORY_MB
+)
+
+
+def get_page_data(page_number):
     url = f"{BASE_URL}?page={page_number}#results"
-    page_school_names = []
+    # 从池里借一个已经启动好的浏览器，用完归还（不再每页 quit）
+    with driver_pool.driver() as driver:
+        return load_page_names(driver, page_number, url)
 
+
+def load_page_names(driver, page_number, url):
+    page_school_names = []
     try:
         print(f"--- Opening page {page_number} (Eager Mode)...")
         driver.get(url)
 
         # --- 关键修改 3: 只检查元素是否存在，不检查可见性 ---
-        # EC.presence_of_element_located: 只要代码里有就行，哪怕被广告挡住也无所谓
-        # EC.visibility_of_element_located: 必须肉眼看得到 (会被广告挡住导致失败)
-        try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.ID, "results"))
-            )
-        except:
-            print(f"Page {page_number}: Wait timeout, trying to parse anyway...")
-
-        # 稍微等一下动态数据填充（React/JS渲染）
-        # 因为是 eager 模式，这里稍微多给一点点时间通常更安全
-        time.sleep(3) 
+        # 哪怕被广告挡住也无所谓：卡片都进了 DOM、而且 DOM 不再变化（React/JS 渲染完）就开始解析，
+        # 不再固定多等 3 秒
+        ready = wait_for_page_ready(driver, expected_cards=10, timeout=10)
+        if ready["state"] != "ready":
+            print(f"Page {page_number}: Wait {ready['state']} ({ready['cards']} cards), trying to parse anyway...")
 
         # 直接暴力读取源码，不管上面有没有覆盖层
         soup = BeautifulSoup(driver.page_source, "html.parser")
@@ -74,12 +96,19 @@ def get_page_data(page_number):
 
     except Exception as e:
         print(f"Error on page {page_number}: {e}")
-    finally:
-        driver.quit()
-        print(f"--- Closed page {page_number}")
     
     return page_school_names
 
+def get_page_data_http(page_number, fetcher):
+    """HTTP 抓取；页面被拦截或需要 JS 渲染时返回 None，由调用方回退到 get_page_data。"""
+    result = fetcher.fetch(f"{BASE_URL}?page={page_number}#results")
+    print(f"--- [HTTP] page {page_number} -> {result['status']} ({result['reason']})")
+    limiter.record(fetch_outcome(result), detail={"page": page_number, "via": "http"})
+    if result["needs_browser"]:
+        return None
+    return extract_schools_from_soup(BeautifulSoup(result["html"], "html.parser"))
+
+
 def scrape_texas_elementary_schools():
     all_rows = []
     seen_names = set()
@@ -88,8 +117,15 @@ def scrape_texas_elementary_schools():
     current_page = 1
     max_pages = 3
 
+    fetcher = HttpFetcher(concurrency=1) if FETCH_MODE == "http" else None
+
     while current_page <= max_pages:
-        names = get_page_data(current_page)
+        limiter.acquire()
+        names = get_page_data_http(current_page, fetcher) if fetcher else None
+        if names is None:
+            names = get_page_data(current_page)
+            limiter.record("ok" if names else "empty",
+                           detail={"page": current_page, "via": "browser"})
 
         if not names:
             print(f"Page {current_page}: No schools extracted. (Check if IP is blocked or structure changed)")
@@ -112,8 +148,12 @@ def scrape_texas_elementary_schools():
             break
 
         current_page += 1
-        # 稍微缩短一点等待，因为 driver 关闭再开启本身就很耗时
-        time.sleep(1) 
+
+    if fetcher:
+        fetcher.close()
+    driver_pool.close()
+    print(f"Rate limiter: {limiter.summary()}")
+    print(f"Driver pool: {driver_pool.summary()}")
 
     if not all_rows:
         return pd.DataFrame()
@@ -9,7 +9,10 @@ import json
 import os
 
 
-BASE_URL = "https://www.usnews.com/education/k12/elementary-schools/texas"
+# 可用环境变量指向本地替身站点（见 fixture_server.py）
+BASE_URL = os.environ.get(
+    "SCRAPER_BASE_URL", "https://www.usnews.com/education/k12/elementary-schools/texas"
+)
 START_PAGE = 1  # 例如从 200 开始
 MAX_PAGES = 661
 
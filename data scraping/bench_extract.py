@@ -0,0 +1,93 @@
+import argparse
+import glob
+import io
+import os
+import re
+import time
+
+from bs4 import BeautifulSoup
+
+from app import extract_schools_from_soup
+from fast_extract import extract_schools_from_html
+
+
+# 和 fixture_server.py 用同一个目录：保存下来的 page_N.html
+FIXTURE_DIR = "fixtures"
+
+
+def load_pages(fixture_dir):
+    pages = []
+    for path in glob.glob(os.path.join(fixture_dir, "page_*.html")):
+        m = re.search(r"page_(\d+)\.html$", path)
+        with open(path, encoding="utf-8") as f:
+            pages.append((int(m.group(1)), f.read()))
+    pages.sort()
+    return pages
+
+
+def run_soup(html, page):
+    buf = io.StringIO()
+    rows = extract_schools_from_soup(BeautifulSoup(html, "html.parser"), page, debug_fp=buf)
+    return rows, buf.getvalue()
+
+
+def run_fast(html, page):
+    buf = io.StringIO()
+    rows = extract_schools_from_html(html, page, debug_fp=buf)
+    return rows, buf.getvalue()
+
+
+EXTRACTORS = {"soup": run_soup, "fast": run_fast}
+
+
+def bench(name, pages, repeat):
+    fn = EXTRACTORS[name]
+    outputs = None
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = [fn(html, page) for page, html in pages]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return outputs, best
+
+
+def compare(pages, soup_out, fast_out):
+    """逐页比较两个引擎的输出（行和 debug JSONL）；返回不一致的页码列表。"""
+    mismatched = []
+    for (page, _html), (s_rows, s_dbg), (f_rows, f_dbg) in zip(pages, soup_out, fast_out):
+        if s_rows != f_rows or s_dbg != f_dbg:
+            mismatched.append(page)
+    return mismatched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the BeautifulSoup and lxml extractors on saved pages and check they agree."
+    )
+    parser.add_argument("--dir", default=FIXTURE_DIR, help="directory with page_N.html files")
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N pages")
+    parser.add_argument("--repeat", type=int, default=3, help="take the best of N runs")
+    args = parser.parse_args()
+
+    pages = load_pages(args.dir)[:args.limit]
+    if not pages:
+        raise SystemExit(f"No page_N.html files found in {args.dir}")
+    total_bytes = sum(len(html) for _, html in pages)
+    print(f"{len(pages)} pages, {total_bytes / 1e6:.1f} MB of HTML, best of {args.repeat}")
+
+    results = {}
+    for name in EXTRACTORS:
+        outputs, elapsed = bench(name, pages, args.repeat)
+        results[name] = (outputs, elapsed)
+        n_rows = sum(len(rows) for rows, _ in outputs)
+        print(f"  {name:>4}: {elapsed:7.3f}s  {len(pages) / elapsed:8.1f} pages/s  ({n_rows} rows)")
+
+    speedup = results["soup"][1] / results["fast"][1]
+    print(f"  fast is {speedup:.1f}x faster")
+
+    mismatched = compare(pages, results["soup"][0], results["fast"][0])
+    if mismatched:
+        print(f"MISMATCH on {len(mismatched)} pages: {mismatched[:20]}")
+        raise SystemExit(1)
+    print("Outputs identical (rows and debug JSONL).")
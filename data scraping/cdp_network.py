@@ -0,0 +1,179 @@
+import base64
+import json
+import threading
+
+
+# 按 URL 模式拦截（Network.setBlockedURLs，支持 * 通配）：广告、统计、追踪脚本
+BLOCKED_URL_PATTERNS = [
+    "*googletagmanager.com*",
+    "*google-analytics.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*googleadservices.com*",
+    "*adservice.google.*",
+    "*amazon-adsystem.com*",
+    "*facebook.net*",
+    "*connect.facebook.*",
+    "*scorecardresearch.com*",
+    "*criteo.*",
+    "*taboola.com*",
+    "*outbrain.com*",
+    "*hotjar.com*",
+    "*newrelic.com*",
+    "*nr-data.net*",
+    "*quantserve.com*",
+    "*chartbeat.*",
+    "*optimizely.com*",
+    "*segment.io*",
+    "*cdn.segment.com*",
+]
+
+# 按资源类型拦截。setBlockedURLs 只认 URL 模式（按类型拦截要用 Fetch 域逐个处理
+# requestPaused 事件，Selenium 的同步接口做不到），所以这里把类型映射成扩展名模式。
+RESOURCE_TYPE_PATTERNS = {
+    "Font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "Stylesheet": ["*.css", "*.css?*"],
+    "Image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.avif"],
+    "Media": ["*.mp4", "*.webm", "*.mp3", "*.m3u8"],
+}
+BLOCKED_RESOURCE_TYPES = ("Font", "Stylesheet", "Image", "Media")
+
+
+def blocked_patterns(url_patterns=BLOCKED_URL_PATTERNS, resource_types=BLOCKED_RESOURCE_TYPES):
+    patterns = list(url_patterns)
+    for rtype in resource_types:
+        patterns.extend(RESOURCE_TYPE_PATTERNS.get(rtype, []))
+    return patterns
+
+
+def enable_performance_log(options):
+    """在 ChromeOptions 上打开 performance 日志，之后可以从里面读出 Network.* 事件。"""
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def install_request_blocking(driver, patterns):
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+
+
+def drain_network_events(driver):
+    """读出（并清空）performance 日志里积累的 Network.* 事件：[(method, params), ...]。"""
+    events = []
+    for entry in driver.get_log("performance"):
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        method = message.get("method", "")
+        if method.startswith("Network."):
+            events.append((method, message.get("params", {})))
+    return events
+
+
+def enable_network_capture(driver):
+    # 加大 DevTools 的响应体缓存，页面上的 JSON 响应在解析前不会被挤掉
+    driver.execute_cdp_cmd(
+        "Network.enable",
+        {"maxTotalBufferSize": 100_000_000, "maxResourceBufferSize": 20_000_000},
+    )
+
+
+def json_responses(driver, events, url_markers=None):
+    """
+    从一页的 Network.* 事件里找出已加载完的 JSON 响应，用 Network.getResponseBody
+    取回响应体并解码。返回 [(url, payload), ...]；url_markers 可以只保留 URL 含某些片段的。
+    """
+    urls = {}
+    finished = set()
+    for method, params in events:
+        if method == "Network.responseReceived":
+            response = params.get("response", {})
+            if "json" in response.get("mimeType", ""):
+                urls[params.get("requestId")] = response.get("url", "")
+        elif method == "Network.loadingFinished":
+            finished.add(params.get("requestId"))
+
+    out = []
+    for request_id, url in urls.items():
+        if request_id not in finished:
+            continue
+        if url_markers and not any(m in url for m in url_markers):
+            continue
+        try:
+            body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except Exception:
+            # 响应体已经被浏览器丢弃（或请求被重定向）时取不到，跳过
+            continue
+        text = body.get("body", "")
+        if body.get("base64Encoded"):
+            text = base64.b64decode(text).decode("utf-8", errors="replace")
+        try:
+            out.append((url, json.loads(text)))
+        except ValueError:
+            continue
+    return out
+
+
+def summarize_network_events(events):
+    """
+    汇总一页的网络流量：
+    requests（发出的请求数）、bytes（实际传输的字节，含头，来自 encodedDataLength）、
+    blocked（被拦截的请求数）、failed（其它失败）、by_type（按资源类型的请求数/字节）。
+    """
+    types = {}
+    bytes_by_id = {}
+    requests = blocked = failed = 0
+    for method, params in events:
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            url = params.get("request", {}).get("url", "")
+            if url.startswith("data:"):
+                continue
+            requests += 1
+            types[request_id] = params.get("type", "Other")
+        elif method == "Network.responseReceived":
+            types[request_id] = params.get("type", types.get(request_id, "Other"))
+        elif method == "Network.loadingFinished":
+            bytes_by_id[request_id] = params.get("encodedDataLength", 0)
+        elif method == "Network.loadingFailed":
+            if params.get("blockedReason"):
+                blocked += 1
+            else:
+                failed += 1
+
+    by_type = {}
+    for request_id, rtype in types.items():
+        stat = by_type.setdefault(rtype, {"requests": 0, "bytes": 0})
+        stat["requests"] += 1
+        stat["bytes"] += int(bytes_by_id.get(request_id, 0))
+    return {
+        "requests": requests,
+        "bytes": int(sum(bytes_by_id.values())),
+        "blocked": blocked,
+        "failed": failed,
+        "by_type": by_type,
+    }
+
+
+class NetworkLog:
+    """每页一行的流量记录（JSONL），多个 worker 可以共用；同时累计整次抓取的总量。"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.totals = {"pages": 0, "requests": 0, "bytes": 0, "blocked": 0}
+
+    def write(self, page, status, stats):
+        with self._lock:
+            self.totals["pages"] += 1
+            for key in ("requests", "bytes", "blocked"):
+                self.totals[key] += stats[key]
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"page": page, "status": status, **stats}, ensure_ascii=False) + "\n")
+
+    def summary(self):
+        with self._lock:
+            totals = dict(self.totals)
+        if totals["pages"]:
+            totals["kb_per_page"] = round(totals["bytes"] / totals["pages"] / 1024, 1)
+        return totals
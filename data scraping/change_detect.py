@@ -0,0 +1,241 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from app_convert_json_to_json import normalize_school
+from dedup_index import normalize_school_url
+
+
+# 增量刷新：每次完整重抓之后运行，只有内容变了的页才继续走 normalize_school 和 CSV。
+# 重抓用 `SCRAPER_REFRESH=1 python app.py`（关掉跨运行去重、每次一个新批次的台账和输出），
+# 否则以前写过的学校会被跳过，输入里就没有它们的卡片。
+STATE_DB = "page_state.sqlite"
+CHANGED_JSONL = "changed_cards.jsonl"
+CHANGESET_JSON = "changeset.json"
+
+
+# ----------------------------
+# 按页读取抓取输出（debug JSONL：一张卡片一行，同一页的行连在一起）
+# ----------------------------
+def iter_pages(path):
+    """按页产出 (page, [line, ...], [card, ...])；同一页出现多段时合并。"""
+    pages = {}
+    order = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            card = json.loads(line)
+            page = card.get("page")
+            if page not in pages:
+                pages[page] = ([], [])
+                order.append(page)
+            pages[page][0].append(line if line.endswith("\n") else line + "\n")
+            pages[page][1].append(card)
+    for page in order:
+        lines, cards = pages[page]
+        yield page, lines, cards
+
+
+def page_hash(cards):
+    """一页卡片列表的内容哈希：卡片顺序、名字、链接和卡片上的所有文字都算在内。"""
+    h = hashlib.sha256()
+    for card in cards:
+        h.update(json.dumps(
+            [card.get("href"), card.get("school_name"), card.get("raw_text_list")],
+            ensure_ascii=False,
+        ).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def card_summary(card):
+    """change-set 里用的学校信息：规范 URL、名字、排名（与 normalize_school 的排名解析一致）。"""
+    return {
+        "url": normalize_school_url(card.get("href")),
+        "name": card.get("school_name"),
+        "rank": normalize_school(card)["rank_state_elementary"],
+    }
+
+
+class PageState:
+    """
+    上一次运行时每页的内容哈希和学校列表（SQLite）。
+    只在结果文件都写好之后 save，中途失败重跑时对比的还是旧状态。
+    """
+
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                page         INTEGER PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                schools      TEXT NOT NULL,
+                updated_at   REAL
+            )
+            """
+        )
+
+    def get(self, page):
+        """返回 (content_hash, schools)；这一页没有记录时返回 (None, [])。"""
+        row = self._conn.execute(
+            "SELECT content_hash, schools FROM pages WHERE page=?", (page,)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else (None, [])
+
+    def page_count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def save(self, updates):
+        """updates: [(page, content_hash, schools), ...]，一个事务写入。"""
+        now = time.time()
+        self._conn.execute("BEGIN")
+        self._conn.executemany(
+            "INSERT INTO pages (page, content_hash, schools, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(page) DO UPDATE SET content_hash=excluded.content_hash, "
+            "schools=excluded.schools, updated_at=excluded.updated_at",
+            [(page, h, json.dumps(schools, ensure_ascii=False), now) for page, h, schools in updates],
+        )
+        self._conn.execute("COMMIT")
+
+    def close(self):
+        self._conn.close()
+
+
+def diff_schools(old, new):
+    """
+    对比变化页上的学校（old / new 都是 {url: summary}，summary 带 page）：
+    新出现的、消失的、排名变了的。学校从一个变化页挪到另一个变化页时算排名变化，
+    不算一删一增（挪到的页内容也变了，所以一定也在对比范围内）。
+    """
+    added = [s for url, s in new.items() if url not in old]
+    removed = [s for url, s in old.items() if url not in new]
+    reranked = [
+        {
+            "url": url,
+            "name": s["name"],
+            "old_rank": old[url]["rank"],
+            "new_rank": s["rank"],
+            "old_page": old[url]["page"],
+            "new_page": s["page"],
+        }
+        for url, s in new.items()
+        if url in old and old[url]["rank"] != s["rank"]
+    ]
+    return added, removed, reranked
+
+
+def detect_changes(in_path, state, changed_out=CHANGED_JSONL, changeset_out=CHANGESET_JSON):
+    """
+    把这次抓取的每页和上次对比：内容哈希不变的页直接跳过，
+    变化的页（含第一次见到的页）原样写进 changed_out，交给 normalize / CSV 增量更新；
+    学校级别的增删和排名变化写进 changeset_out。返回 (change-set, updates)。
+    只对比这次抓到的页；没抓到的页保持上次的状态，不算删除。
+    页状态不在这里保存：调用方等下游（normalize / CSV）都成功后再 state.save(updates)，
+    中途失败时下次运行这些页仍算变化页。
+    """
+    if not os.path.exists(in_path):
+        raise FileNotFoundError(f"crawl output {in_path} does not exist")
+    old_schools, new_schools = {}, {}
+    updates = []
+    counts = {"total": 0, "changed": 0, "new": 0, "unchanged": 0}
+
+    tmp = changed_out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        for page, lines, cards in iter_pages(in_path):
+            counts["total"] += 1
+            digest = page_hash(cards)
+            old_hash, old_list = state.get(page)
+            if digest == old_hash:
+                counts["unchanged"] += 1
+                continue
+            counts["new" if old_hash is None else "changed"] += 1
+
+            out.writelines(lines)
+            new_list = [s for s in map(card_summary, cards) if s["url"]]
+            for s in old_list:
+                old_schools.setdefault(s["url"], {**s, "page": page})
+            for s in new_list:
+                new_schools.setdefault(s["url"], {**s, "page": page})
+            updates.append((page, digest, new_list))
+    if counts["total"] == 0:
+        # 什么都没抓到不等于什么都没变：多半是重抓时去重没关，或者抓取失败了
+        os.remove(tmp)
+        raise ValueError(
+            f"{in_path} has no cards; was the refresh crawl run with SCRAPER_REFRESH set? "
+            "Nothing was compared and the previous state is unchanged."
+        )
+    known = state.page_count()
+    if counts["total"] < known / 2:
+        print(f"⚠️ Only {counts['total']} page(s) in {in_path}, the previous run had {known}; "
+              "pages that were not crawled are kept as they were.")
+    os.replace(tmp, changed_out)
+
+    added, removed, reranked = diff_schools(old_schools, new_schools)
+    changeset = {
+        "run_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": in_path,
+        "pages": counts,
+        "changed_pages": [page for page, _, _ in updates],
+        "added": added,
+        "removed": removed,
+        "reranked": reranked,
+    }
+    tmp = changeset_out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(changeset, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, changeset_out)
+    return changeset, updates
+
+
+def main(in_path, state_path=STATE_DB, changed_out=CHANGED_JSONL, changeset_out=CHANGESET_JSON,
+         normalized_out=None, csv_path=None):
+    state = PageState(state_path)
+    try:
+        changeset, updates = detect_changes(in_path, state, changed_out, changeset_out)
+        pages = changeset["pages"]
+        print(f"Pages: {pages['total']} crawled, {pages['changed']} changed, {pages['new']} new, "
+              f"{pages['unchanged']} unchanged")
+        print(f"Schools: {len(changeset['added'])} added, {len(changeset['removed'])} removed, "
+              f"{len(changeset['reranked'])} re-ranked (see {changeset_out})")
+
+        if normalized_out is not None:
+            # 只有变化的页需要重新标准化
+            from app_convert_json_to_json import main as normalize_main
+            normalize_main(changed_out, normalized_out)
+            if csv_path is not None:
+                from app_convert_json_to_csv import update_csv
+                n_rows = update_csv(normalized_out, csv_path, changeset["changed_pages"])
+                print(f"Updated {csv_path}: {len(changeset['changed_pages'])} page(s) replaced, "
+                      f"{n_rows} rows total")
+        # 下游都成功了才记下这次的页状态
+        state.save(updates)
+    finally:
+        state.close()
+    return changeset
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare a crawl with the previous one page by page; pass only changed pages downstream.")
+    parser.add_argument("in_path", nargs="?", default="debug_raw_card_text.jsonl",
+                        help="crawl output (debug JSONL) from a full re-crawl")
+    parser.add_argument("--state", default=STATE_DB, help="per-page hashes from the previous run")
+    parser.add_argument("--changed", default=CHANGED_JSONL, help="cards of changed pages only")
+    parser.add_argument("--changeset", default=CHANGESET_JSON, help="added / removed / re-ranked schools")
+    parser.add_argument("--normalize", metavar="OUT_JSONL", default=None,
+                        help="also normalize the changed pages into this file")
+    parser.add_argument("--csv", default=None,
+                        help="with --normalize: replace the changed pages' rows in this CSV")
+    args = parser.parse_args()
+    try:
+        main(args.in_path, args.state, args.changed, args.changeset, args.normalize, args.csv)
+    except (OSError, ValueError) as e:
+        sys.exit(f"change_detect: {e}")
@@ -0,0 +1,173 @@
+import random
+import sqlite3
+import threading
+import time
+
+
+class CrawlLedger:
+    """
+    持久化的抓取台账（SQLite）：记录每一页的状态、尝试次数、行数和内容哈希。
+
+    - status: pending / done / empty / blocked / timeout / error
+    - 重启后 done 的页自动跳过；失败页按指数退避重试，超过 max_attempts 后放弃
+    - meta 表保存 debug JSONL（以及 JSON 捕获模式的记录文件）已提交的字节偏移，
+      重启时据此截掉没提交完的页块，保证输出文件里不会出现重复的页
+    """
+
+    def __init__(self, path, max_attempts=5, backoff_base=30.0, backoff_cap=900.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                page            INTEGER PRIMARY KEY,
+                status          TEXT    NOT NULL DEFAULT 'pending',
+                attempts        INTEGER NOT NULL DEFAULT 0,
+                row_count       INTEGER,
+                content_hash    TEXT,
+                last_error      TEXT,
+                next_attempt_at REAL    NOT NULL DEFAULT 0,
+                updated_at      REAL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key   TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+
+    def seed(self, pages):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO pages (page) VALUES (?)", [(p,) for p in pages]
+            )
+
+    def pages_due(self, now=None):
+        """还没完成、未超过重试上限、且退避时间已到的页（按页码排序）。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page FROM pages WHERE status != 'done' AND attempts < ? "
+                "AND next_attempt_at <= ? ORDER BY page",
+                (self.max_attempts, now),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def seconds_until_next_retry(self, now=None):
+        """距离下一页可以重试还要等多久；没有可重试的页时返回 None。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM pages "
+                "WHERE status != 'done' AND attempts < ?",
+                (self.max_attempts,),
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - now)
+
+    def record_done(self, page, row_count, content_hash, debug_offset=None, records_offset=None):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "UPDATE pages SET status='done', attempts=attempts+1, row_count=?, "
+                "content_hash=?, last_error=NULL, updated_at=? WHERE page=?",
+                (row_count, content_hash, time.time(), page),
+            )
+            if debug_offset is not None:
+                self._set_meta("debug_offset", str(debug_offset))
+            if records_offset is not None:
+                self._set_meta("records_offset", str(records_offset))
+            self._conn.execute("COMMIT")
+
+    def record_done_many(self, done, debug_offset=None, records_offset=None):
+        """一个事务里把多页记为完成；done 是 [(page, row_count, content_hash), ...]。"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE pages SET status='done', attempts=attempts+1, row_count=?, "
+                "content_hash=?, last_error=NULL, updated_at=? WHERE page=?",
+                [(n_rows, content_hash, now, page) for page, n_rows, content_hash in done],
+            )
+            if debug_offset is not None:
+                self._set_meta("debug_offset", str(debug_offset))
+            if records_offset is not None:
+                self._set_meta("records_offset", str(records_offset))
+            self._conn.execute("COMMIT")
+
+    def record_failure(self, page, status, error=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts FROM pages WHERE page=?", (page,)
+            ).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            delay = min(self.backoff_cap, self.backoff_base * 2 ** (attempts - 1))
+            delay *= random.uniform(0.8, 1.2)
+            now = time.time()
+            self._conn.execute(
+                "INSERT INTO pages (page, status, attempts, last_error, next_attempt_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(page) DO UPDATE SET status=excluded.status, "
+                "attempts=excluded.attempts, last_error=excluded.last_error, "
+                "next_attempt_at=excluded.next_attempt_at, updated_at=excluded.updated_at",
+                (page, status, attempts, error, now + delay, now),
+            )
+        return attempts
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            (key, value),
+        )
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._set_meta(key, value)
+
+    @property
+    def debug_offset(self):
+        value = self.get_meta("debug_offset")
+        return int(value) if value is not None else None
+
+    @debug_offset.setter
+    def debug_offset(self, value):
+        self.set_meta("debug_offset", str(value))
+
+    @property
+    def records_offset(self):
+        value = self.get_meta("records_offset")
+        return int(value) if value is not None else None
+
+    @records_offset.setter
+    def records_offset(self, value):
+        self.set_meta("records_offset", str(value))
+
+    def summary(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*), SUM(COALESCE(row_count, 0)) FROM pages GROUP BY status"
+            ).fetchall()
+            gave_up = self._conn.execute(
+                "SELECT COUNT(*) FROM pages WHERE status != 'done' AND attempts >= ?",
+                (self.max_attempts,),
+            ).fetchone()[0]
+        result = {status: {"pages": n, "rows": r} for status, n, r in rows}
+        result["gave_up"] = gave_up
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,161 @@
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+
+DEFAULT_ORIGIN = "https://www.usnews.com"
+
+
+def normalize_school_url(url, origin=DEFAULT_ORIGIN):
+    """
+    去重用的规范 URL：补全相对路径、协议和主机小写、去掉 query / fragment 和结尾的 /，
+    路径小写（站点的 slug 本来就是小写，大小写不同的链接指向同一所学校）。
+    """
+    if not url:
+        return None
+    url = url.strip()
+    if url.startswith("/"):
+        url = origin + url
+    parts = urlsplit(url)
+    path = parts.path.rstrip("/").lower() or "/"
+    return urlunsplit((parts.scheme.lower() or "https", parts.netloc.lower(), path, "", ""))
+
+
+def url_key(normalized_url):
+    # 16 字节摘要做主键：比存整条 URL 省空间，碰撞概率可以忽略
+    return hashlib.sha256(normalized_url.encode("utf-8")).digest()[:16]
+
+
+class BloomFilter:
+    """
+    固定大小的 Bloom 过滤器（内存占用只取决于 capacity 和 error_rate）。
+    “不在”是确定的；“在”可能误判，需要再查一次磁盘上的索引。
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.n_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.n_bits + 7) // 8)
+
+    def _positions(self, key):
+        # 双重哈希：用 16 字节摘要的两半生成 k 个位置
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        return ((h1 + i * h2) % self.n_bits for i in range(self.n_hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class DedupIndex:
+    """
+    跨运行持久化的学校去重索引（SQLite），以规范化后的 school_url 为键。
+
+    - 磁盘上是一张 WITHOUT ROWID 的哈希表，内存占用不随 URL 数量增长
+    - 可选 Bloom 过滤器挡在前面：绝大多数新 URL 不用查磁盘就能确认“没见过”
+    - 线程安全（多个写入线程可以共用）
+    """
+
+    def __init__(self, path, bloom_capacity=None, bloom_error_rate=0.001):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS seen (
+                url_key    BLOB PRIMARY KEY,
+                url        TEXT NOT NULL,
+                first_page INTEGER,
+                first_seen REAL
+            ) WITHOUT ROWID
+            """
+        )
+        self.stats = {"lookups": 0, "bloom_negative": 0, "disk_lookups": 0, "added": 0}
+
+        self.bloom = None
+        if bloom_capacity:
+            self.bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+            # 用已有的键预热过滤器（按游标逐行读，不整表装进内存）
+            for (key,) in self._conn.execute("SELECT url_key FROM seen"):
+                self.bloom.add(key)
+
+    def _seen(self, key):
+        self.stats["lookups"] += 1
+        if self.bloom is not None and key not in self.bloom:
+            self.stats["bloom_negative"] += 1
+            return False
+        self.stats["disk_lookups"] += 1
+        return self._conn.execute("SELECT 1 FROM seen WHERE url_key=?", (key,)).fetchone() is not None
+
+    def contains(self, url):
+        normalized = normalize_school_url(url)
+        if normalized is None:
+            return False
+        with self._lock:
+            return self._seen(url_key(normalized))
+
+    def __contains__(self, url):
+        return self.contains(url)
+
+    def unseen(self, urls):
+        """urls 里还没进索引的那些（保持顺序，批内重复只保留第一个）。只查不写。"""
+        out = []
+        batch = set()
+        with self._lock:
+            for url in urls:
+                normalized = normalize_school_url(url)
+                if normalized is None or normalized in batch:
+                    continue
+                batch.add(normalized)
+                if not self._seen(url_key(normalized)):
+                    out.append(url)
+        return out
+
+    def add_many(self, entries):
+        """把 [(url, page), ...] 记入索引（已存在的忽略），返回新增条数。"""
+        rows = []
+        for url, page in entries:
+            normalized = normalize_school_url(url)
+            if normalized is not None:
+                rows.append((url_key(normalized), normalized, page, time.time()))
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen (url_key, url, first_page, first_seen) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+            added = self._conn.total_changes - before
+            if self.bloom is not None:
+                for key, *_ in rows:
+                    self.bloom.add(key)
+            self.stats["added"] += added
+        return added
+
+    def add(self, url, page=None):
+        return self.add_many([(url, page)]) == 1
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["size"] = len(self)
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
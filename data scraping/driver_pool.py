@@ -0,0 +1,161 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:  # 没装 psutil 时退回用页面 JS 堆大小估算内存
+    psutil = None
+
+
+class DriverPool:
+    """
+    可复用的浏览器池：启动过的 Chrome 留着给下一页用，不再每页开关一次。
+
+        pool = DriverPool(build_driver, size=1, max_pages=100, max_memory_mb=1500)
+        with pool.driver() as driver:
+            driver.get(url)
+        pool.close()
+
+    - 借出前做健康检查（execute_script 能正常返回），挂掉的实例直接换掉
+    - 归还时如果已经用了 max_pages 页，或内存超过 max_memory_mb，就关掉重开，防止泄漏越积越多
+    - 线程安全：最多同时存在 size 个实例，借不到时阻塞等待
+    """
+
+    def __init__(self, factory, size=1, max_pages=100, max_memory_mb=1500):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+
+        self._idle = queue.LifoQueue()  # 后进先出：优先用刚用过的（已预热）实例
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(size)
+        self._pages = {}  # id(driver) -> 已处理页数
+        self._closed = False
+        self.stats = {"launched": 0, "recycled": 0, "unhealthy": 0, "pages": 0, "launch_seconds": 0.0}
+
+    # ----------------------------
+    # 实例的创建、检查、回收
+    # ----------------------------
+    def _launch(self):
+        start = time.perf_counter()
+        driver = self.factory()
+        with self._lock:
+            self.stats["launched"] += 1
+            self.stats["launch_seconds"] += time.perf_counter() - start
+            self._pages[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def is_healthy(driver):
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def memory_mb(driver):
+        """浏览器占用的内存（MB）：有 psutil 时算整个 Chrome 进程树的 RSS，否则取 JS 堆大小。"""
+        try:
+            if psutil is not None:
+                root = psutil.Process(driver.service.process.pid)
+                procs = [root] + root.children(recursive=True)
+                return sum(p.memory_info().rss for p in procs) / 1e6
+            used = driver.execute_script(
+                "return performance.memory ? performance.memory.usedJSHeapSize : null"
+            )
+            return used / 1e6 if used else None
+        except Exception:
+            return None
+
+    def _should_recycle(self, driver):
+        with self._lock:
+            pages = self._pages.get(id(driver), 0)
+        if pages >= self.max_pages:
+            return f"served {pages} pages"
+        if self.max_memory_mb:
+            mem = self.memory_mb(driver)
+            if mem is not None and mem > self.max_memory_mb:
+                return f"using {mem:.0f} MB"
+        return None
+
+    # ----------------------------
+    # 借出 / 归还
+    # ----------------------------
+    def acquire(self):
+        if self._closed:
+            raise RuntimeError("driver pool is closed")
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._launch()
+                if self.is_healthy(driver):
+                    return driver
+                print("[pool] driver failed health check, replacing it")
+                with self._lock:
+                    self.stats["unhealthy"] += 1
+                self._discard(driver)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, driver):
+        try:
+            with self._lock:
+                self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+                self.stats["pages"] += 1
+            reason = None if self._closed else self._should_recycle(driver)
+            if self._closed or reason:
+                if reason:
+                    print(f"[pool] recycling driver ({reason})")
+                    with self._lock:
+                        self.stats["recycled"] += 1
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["launch_seconds"] = round(stats["launch_seconds"], 1)
+        if stats["launched"]:
+            stats["pages_per_launch"] = round(stats["pages"] / stats["launched"], 1)
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+from bs4 import BeautifulSoup
+
+from http_fetch import DEFAULT_HEADERS
+from app_convert_json_to_json import load_records, write_records
+
+
+CACHE_DIR = "detail_cache"
+CONCURRENCY = 8
+# 可以把详情页请求指向本地替身站点（见 fixture_server.py），只替换协议和主机部分
+DETAIL_ORIGIN = os.environ.get("SCRAPER_DETAIL_ORIGIN")
+
+
+# ----------------------------
+# 磁盘缓存：每个 URL 一份 HTML（gzip）+ 一份元数据（ETag / Last-Modified）
+# ----------------------------
+class DetailCache:
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return base + ".json", base + ".html.gz"
+
+    def get(self, url):
+        """返回 (meta, html)；没缓存时返回 (None, None)。"""
+        meta_path, body_path = self._paths(url)
+        if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+            return None, None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with gzip.open(body_path, "rt", encoding="utf-8") as f:
+            return meta, f.read()
+
+    def put(self, url, html, etag=None, last_modified=None):
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        # 先写正文再写元数据，元数据在就说明正文是完整的
+        tmp = body_path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(tmp, body_path)
+        self.put_meta(url, {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+        })
+
+    def put_meta(self, url, meta):
+        meta_path, _ = self._paths(url)
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+
+# ----------------------------
+# 并发条件请求
+# ----------------------------
+def request_url(url, origin=DETAIL_ORIGIN):
+    if not origin:
+        return url
+    target = urlsplit(origin)
+    parts = urlsplit(url)
+    return urlunsplit((target.scheme, target.netloc, parts.path, parts.query, ""))
+
+
+async def fetch_one(client, semaphore, cache, url, origin, stats):
+    """抓一个详情页（能用缓存就发条件请求），解析后只返回 (url, 字段)；拿不到页面时字段是 None。"""
+    meta, cached_html = cache.get(url)
+    headers = {}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    async with semaphore:
+        try:
+            resp = await client.get(request_url(url, origin), headers=headers)
+        except httpx.HTTPError as e:
+            stats["error"] += 1
+            print(f"[detail] {url}: {type(e).__name__}: {e}")
+            # 网络出错时有旧缓存就先用旧的
+            return url, parse_cached(cached_html)
+
+    if resp.status_code == 304 and cached_html is not None:
+        stats["not_modified"] += 1
+        meta["fetched_at"] = time.time()
+        cache.put_meta(url, meta)
+        return url, parse_detail_page(cached_html)
+    if resp.status_code == 200:
+        stats["fetched"] += 1
+        cache.put(url, resp.text, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        return url, parse_detail_page(resp.text)
+
+    stats["error"] += 1
+    print(f"[detail] {url}: HTTP {resp.status_code}")
+    return url, parse_cached(cached_html)
+
+
+def parse_cached(html):
+    return parse_detail_page(html) if html is not None else None
+
+
+async def fetch_all(urls, cache, concurrency=CONCURRENCY, origin=DETAIL_ORIGIN):
+    """
+    并发抓取（最多 concurrency 个同时进行），返回 ({url: 解析出的字段}, stats)。
+    每页抓到就解析，HTML 只在缓存里，内存里只留字段。
+    """
+    stats = {"fetched": 0, "not_modified": 0, "error": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(
+        headers=DEFAULT_HEADERS, timeout=20.0, limits=limits, follow_redirects=True
+    ) as client:
+        results = await asyncio.gather(
+            *(fetch_one(client, semaphore, cache, u, origin, stats) for u in urls)
+        )
+    return {url: detail for url, detail in results if detail is not None}, stats
+
+
+# ----------------------------
+# 解析详情页
+# ----------------------------
+def parse_detail_page(html):
+    """
+    从详情页取完整字段：
+    - description：页面 meta description，或正文里第一段含 " is a " 的完整介绍（卡片上的是截断的）
+    - details：页面上所有 “标签 -> 值” 对（dt/dd、表格 th/td）
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    description = None
+    for p in soup.find_all("p"):
+        text = p.get_text(" ", strip=True)
+        if " is a " in text:
+            description = text
+            break
+    if description is None:
+        meta = soup.find("meta", attrs={"name": "description"})
+        if meta and meta.get("content"):
+            description = meta["content"].strip()
+
+    details = {}
+    for dt in soup.find_all("dt"):
+        dd = dt.find_next_sibling("dd")
+        label = dt.get_text(" ", strip=True)
+        if label and dd is not None:
+            details.setdefault(label, dd.get_text(" ", strip=True))
+    for tr in soup.find_all("tr"):
+        th, td = tr.find("th"), tr.find("td")
+        if th is not None and td is not None:
+            label = th.get_text(" ", strip=True)
+            if label:
+                details.setdefault(label, td.get_text(" ", strip=True))
+
+    return {"description": description, "details": details}
+
+
+def record_url(record):
+    return (record.get("source_meta") or {}).get("school_url") or record.get("school_url")
+
+
+def enrich_records(records, details_by_url):
+    """把详情页字段并回标准化后的记录：完整 description 替换截断的，details 整体附上。"""
+    enriched = 0
+    for record in records:
+        detail = details_by_url.get(record_url(record))
+        if detail is None:
+            continue
+        if detail["description"]:
+            record["description"] = detail["description"]
+        record["details"] = detail["details"]
+        enriched += 1
+    return enriched
+
+
+def main(in_path, out_path, cache_dir=CACHE_DIR, concurrency=CONCURRENCY, origin=DETAIL_ORIGIN):
+    records = load_records(in_path)
+    urls = list(dict.fromkeys(u for u in (record_url(r) for r in records) if u))
+    if not urls:
+        print("No school_url in the input records; re-run the converter on the crawl output first.")
+        return
+
+    start = time.perf_counter()
+    details, stats = asyncio.run(fetch_all(urls, DetailCache(cache_dir), concurrency, origin))
+    elapsed = time.perf_counter() - start
+    print(f"Detail pages: {len(urls)} urls in {elapsed:.1f}s -> {stats}")
+
+    enriched = enrich_records(records, details)
+    write_records(records, out_path)
+    print(f"Wrote {out_path} ({enriched}/{len(records)} records enriched)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch per-school detail pages and merge their fields into normalized records.")
+    parser.add_argument("in_path", nargs="?", default="converted_test.jsonl")
+    parser.add_argument("out_path", nargs="?", default="enriched_test.jsonl")
+    parser.add_argument("--cache", default=CACHE_DIR, help="on-disk response cache directory")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--origin", default=DETAIL_ORIGIN,
+                        help="send requests to this origin instead, e.g. http://127.0.0.1:8765")
+    args = parser.parse_args()
+    main(args.in_path, args.out_path, args.cache, args.concurrency, args.origin)
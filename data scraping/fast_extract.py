@@ -0,0 +1,145 @@
+import json
+
+import lxml.html
+
+
+SCHOOL_LINK_MARKER = "/education/k12/texas/"
+SCHOOL_URL_PREFIX = "https://www.usnews.com"
+CARD_DEPTH = 4  # 从学校链接往上爬几层算作卡片容器（与 extract_schools_from_soup 一致）
+
+# 这些标签里的文本不算卡片文字（BeautifulSoup 的 stripped_strings 同样跳过）
+_SKIP_TEXT_TAGS = {"script", "style", "template"}
+
+
+def parse_html(html):
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # 带 XML 编码声明的 str 不能直接交给 lxml，转成 bytes 再解析
+        return lxml.html.document_fromstring(html.encode("utf-8"))
+
+
+def _text_of(el):
+    """元素自身的 text，注释/脚本等不算。"""
+    if not isinstance(el.tag, str) or el.tag in _SKIP_TEXT_TAGS:
+        return None
+    return el.text
+
+
+def card_strings(card):
+    """
+    一次遍历拿到卡片里所有去掉首尾空白后非空的文本片段（顺序同 stripped_strings）。
+    """
+    out = []
+    for el in card.iter():
+        text = _text_of(el)
+        if text:
+            s = text.strip()
+            if s:
+                out.append(s)
+        # tail 属于父节点的文本；卡片根节点的 tail 在卡片外面
+        if el is not card and el.tail:
+            s = el.tail.strip()
+            if s:
+                out.append(s)
+    return out
+
+
+def link_text(a):
+    # 等价于 BeautifulSoup 的 a.get_text(strip=True)
+    return "".join(card_strings(a))
+
+
+def fields_from_strings(card_texts):
+    """从卡片文字里一趟取出 rank / location / district / 年级 / 人数 / 师生比。"""
+    fields = {
+        "rank": None,
+        "location": None,
+        "district": None,
+        "grade_level": None,
+        "enrollment": None,
+        "student_teacher_ratio": None,
+    }
+    rank_seen = False
+    last = len(card_texts) - 1
+    for i, t in enumerate(card_texts):
+        if not rank_seen and t.startswith("#") and "Texas Elementary Schools" in t:
+            rank_seen = True
+            try:
+                fields["rank"] = int(t.split()[0].lstrip("#"))
+            except Exception:
+                pass
+        if fields["location"] is None and "," in t and "Elementary Schools" not in t and "Ratio" not in t:
+            fields["location"] = t
+        if fields["district"] is None and "Independent School District" in t:
+            fields["district"] = t
+        if i < last:
+            if "Grade Level" in t:
+                fields["grade_level"] = card_texts[i + 1]
+            elif "Enrollment" in t:
+                fields["enrollment"] = card_texts[i + 1]
+            elif "Student-Teacher Ratio" in t:
+                fields["student_teacher_ratio"] = card_texts[i + 1]
+    return fields
+
+
+def extract_schools_from_html(html, page_number, debug_fp=None):
+    """
+    extract_schools_from_soup 的快速版：lxml 解析，每张卡片只遍历一次，
+    输出（返回的行和写进 debug_fp 的 JSONL）与原版逐字段一致。
+    """
+    root = parse_html(html)
+    found = root.xpath('//*[@id="results"]')
+    results_section = found[0] if found else root
+
+    schools = []
+    cards = {}  # 同一张卡片里的多个链接只取一次文字
+    for a in results_section.iter("a"):
+        href = a.get("href")
+        if href is None:
+            continue
+        text = link_text(a)
+        if not (
+            SCHOOL_LINK_MARKER in href
+            and "/districts/" not in href
+            and text
+            and len(text) > 3
+            and text != "Read More"
+        ):
+            continue
+
+        card = a
+        for _ in range(CARD_DEPTH):
+            parent = card.getparent()
+            if parent is None:
+                break
+            card = parent
+
+        if card not in cards:
+            cards[card] = card_strings(card)
+        card_texts = cards[card]
+
+        if debug_fp is not None:
+            debug_fp.write(json.dumps(
+                {
+                    "page": page_number,
+                    "school_name": text,
+                    "href": href,
+                    "raw_text_list": card_texts,
+                },
+                ensure_ascii=False,
+            ) + "\n")
+
+        row = {"page": page_number}
+        fields = fields_from_strings(card_texts)
+        row["rank"] = fields.pop("rank")
+        row["school_name"] = text
+        row.update(fields)
+        row["school_url"] = SCHOOL_URL_PREFIX + href
+        schools.append(row)
+
+    # 当前页内按 school_url 去重
+    unique = {}
+    for s in schools:
+        unique.setdefault(s["school_url"], s)
+    return list(unique.values())
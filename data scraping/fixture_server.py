@@ -0,0 +1,211 @@
+import argparse
+import gzip
+import hashlib
+import os
+import random
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+FIXTURE_DIR = "fixtures"
+RESULTS_PATH = "/education/k12/elementary-schools/texas"
+DETAIL_PREFIX = "/education/k12/texas/"
+
+# 和站点拦截时返回的页面一样：标题是 Access Denied，抓取端据此判为 blocked
+ACCESS_DENIED_HTML = (
+    "<html><head><title>Access Denied</title></head>"
+    "<body><h1>Access Denied</h1><p>You don't have permission to access this page.</p></body></html>"
+)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    本地替身站点：
+    - 结果页：?page=N 映射到 <fixture_dir>/page_N.html（抓取时保存下来的原始页面）
+    - 学校详情页：/education/k12/texas/<slug> 映射到 <fixture_dir>/details/<slug>.html，
+      带 ETag / Last-Modified，条件请求命中时返回 304
+
+    故障注入（压测限速器 / 并发用）：每个请求先等 latency_ms ± jitter_ms，
+    再按 timeout_rate 的概率挂起 hang_seconds 后断开（客户端看到超时），
+    按 block_rate 的概率返回 403 Access Denied。随机数由 (seed, 路径, 该路径第几次请求)
+    决定，同样的配置重放时每页的遭遇一样，和并发下请求到达的先后无关；
+    同一页重试时是新的一次抽签。
+    """
+
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    fixture_dir = FIXTURE_DIR
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    block_rate = 0.0
+    timeout_rate = 0.0
+    hang_seconds = 30.0
+    seed = 0
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_html(self, status, body, extra_headers=None):
+        data = body.encode("utf-8")
+        headers = {"Content-Type": "text/html; charset=utf-8", **(extra_headers or {})}
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data)
+            headers["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.count(f"http_{status}", len(data))
+
+    def send_not_modified(self, headers):
+        self.send_response(304)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        self.count("http_304")
+
+    def count(self, key, n_bytes=0):
+        stats = getattr(self.server, "stats", None)
+        if stats is None:
+            return
+        with self.server.stats_lock:
+            stats[key] = stats.get(key, 0) + 1
+            stats["bytes"] = stats.get("bytes", 0) + n_bytes
+
+    def request_rng(self):
+        """这个请求的随机数发生器：由种子、路径和该路径的请求序号决定。"""
+        key = self.path.split("#", 1)[0]
+        counts = getattr(self.server, "path_counts", None)
+        if counts is None:
+            return random.Random(f"{self.seed}:{key}:1")
+        with self.server.stats_lock:
+            counts[key] = counts.get(key, 0) + 1
+            n = counts[key]
+        return random.Random(f"{self.seed}:{key}:{n}")
+
+    def inject_faults(self):
+        """按配置加延迟、注入超时 / 拦截；已经替客户端处理掉这个请求时返回 True。"""
+        if not (self.latency_ms or self.jitter_ms or self.block_rate or self.timeout_rate):
+            return False
+        rng = self.request_rng()
+        delay_ms = max(0.0, self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms))
+        roll = rng.random()
+        if delay_ms:
+            time.sleep(delay_ms / 1000)
+        if roll < self.timeout_rate:
+            self.count("timeout")
+            time.sleep(self.hang_seconds)
+            # 不发任何响应直接断开
+            self.close_connection = True
+            return True
+        if roll < self.timeout_rate + self.block_rate:
+            self.send_html(403, ACCESS_DENIED_HTML)
+            self.count("blocked")
+            return True
+        return False
+
+    def serve_detail(self, slug):
+        path = os.path.join(self.fixture_dir, "details", f"{os.path.basename(slug)}.html")
+        if not os.path.exists(path):
+            return self.send_html(404, "<html><title>Not Found</title></html>")
+        with open(path, encoding="utf-8") as f:
+            body = f.read()
+        mtime = int(os.path.getmtime(path))
+        validators = {
+            "ETag": '"%s"' % hashlib.sha1(body.encode("utf-8")).hexdigest(),
+            "Last-Modified": formatdate(mtime, usegmt=True),
+        }
+
+        if_none_match = self.headers.get("If-None-Match")
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_none_match is not None:
+            if validators["ETag"] in [t.strip() for t in if_none_match.split(",")]:
+                return self.send_not_modified(validators)
+        elif if_modified_since is not None:
+            try:
+                if mtime <= parsedate_to_datetime(if_modified_since).timestamp():
+                    return self.send_not_modified(validators)
+            except (TypeError, ValueError):
+                pass
+        self.send_html(200, body, validators)
+
+    def do_GET(self):
+        self.count("requests")
+        if self.inject_faults():
+            return
+        url = urlparse(self.path)
+        if url.path.startswith(DETAIL_PREFIX):
+            return self.serve_detail(url.path[len(DETAIL_PREFIX):].strip("/"))
+        try:
+            page = int(parse_qs(url.query).get("page", ["1"])[0])
+        except ValueError:
+            return self.send_html(400, "<html><title>Bad Request</title></html>")
+
+        path = os.path.join(self.fixture_dir, f"page_{page}.html")
+        if not os.path.exists(path):
+            return self.send_html(404, "<html><title>Not Found</title></html>")
+        with open(path, encoding="utf-8") as f:
+            self.send_html(200, f.read())
+
+
+def start_fixture_server(fixture_dir=FIXTURE_DIR, host="127.0.0.1", port=0, **faults):
+    """
+    后台线程启动替身服务器，返回 (server, base_url)；用完调用 server.shutdown()。
+    faults 可以是 latency_ms / jitter_ms / block_rate / timeout_rate / hang_seconds / seed，
+    含义见 FixtureHandler。请求统计在 fixture_stats(server)。
+    """
+    unknown = set(faults) - {"latency_ms", "jitter_ms", "block_rate", "timeout_rate", "hang_seconds", "seed"}
+    if unknown:
+        raise TypeError(f"unknown fault option(s): {', '.join(sorted(unknown))}")
+    handler = type("BoundFixtureHandler", (FixtureHandler,), {"fixture_dir": fixture_dir, **faults})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True  # 挂起中的请求不拦着退出
+    server.stats = {}
+    server.path_counts = {}
+    server.stats_lock = threading.Lock()
+    server.started_at = time.monotonic()
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}{RESULTS_PATH}"
+    return server, base_url
+
+
+def fixture_stats(server):
+    """服务器端看到的请求数、各状态码数、注入的拦截 / 超时数、发出的字节数和请求速率。"""
+    with server.stats_lock:
+        stats = dict(server.stats)
+    elapsed = time.monotonic() - server.started_at
+    stats["elapsed_s"] = round(elapsed, 1)
+    stats["requests_per_sec"] = round(stats.get("requests", 0) / elapsed, 2) if elapsed > 0 else None
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve saved result pages as a local stand-in site.")
+    parser.add_argument("--dir", default=FIXTURE_DIR, help="directory with page_N.html files")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="base delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform +/- jitter around --latency-ms")
+    parser.add_argument("--block-rate", type=float, default=0.0, help="fraction of requests answered with 403 Access Denied")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of requests that hang, then drop the connection")
+    parser.add_argument("--hang-seconds", type=float, default=30.0, help="how long a timed-out request hangs")
+    parser.add_argument("--seed", type=int, default=0, help="fault schedule seed (same seed = same faults per page)")
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(
+        args.dir, args.host, args.port,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, block_rate=args.block_rate,
+        timeout_rate=args.timeout_rate, hang_seconds=args.hang_seconds, seed=args.seed,
+    )
+    print(f"Serving {args.dir} at {base_url}?page=N  (Ctrl+C to stop)")
+    print(f"Point the scrapers at it with: SCRAPER_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Fixture server stats: {fixture_stats(server)}")
@@ -0,0 +1,174 @@
+import asyncio
+import re
+import threading
+import time
+
+import httpx
+
+try:
+    import brotli  # noqa: F401  httpx 只有装了 brotli 才会解压 br
+except ImportError:  # 没装就不声明 br，否则站点回的 br 正文原样到手，每页都会被判成 js-only
+    brotli = None
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    # httpx 自动解压 gzip/deflate；br 只在装了 brotli 时声明
+    "Accept-Encoding": "gzip, deflate, br" if brotli is not None else "gzip, deflate",
+}
+
+BLOCK_TITLE_MARKERS = ("Access Denied", "Just a moment")
+BLOCK_STATUS_CODES = {403, 429, 503}
+SCHOOL_LINK_MARKER = "/education/k12/texas/"
+
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+_RESULTS_RE = re.compile(r"""id\s*=\s*["']results["']""", re.IGNORECASE)
+
+
+def page_title(html):
+    m = _TITLE_RE.search(html or "")
+    return m.group(1).strip() if m else ""
+
+
+def classify_html(status_code, html):
+    """
+    判断一次 HTTP 抓取的结果能否直接交给 extract_schools_from_soup。
+    返回 (needs_browser, reason)：
+    - 被拦截（403/429/503，或标题是 "Access Denied" / "Just a moment"）
+    - 纯 JS 渲染（HTML 里没有 #results 或没有学校链接）
+    """
+    if status_code in BLOCK_STATUS_CODES:
+        return True, f"blocked (HTTP {status_code})"
+    title = page_title(html)
+    if any(marker in title for marker in BLOCK_TITLE_MARKERS):
+        return True, f"blocked (title: {title})"
+    if status_code != 200:
+        return True, f"HTTP {status_code}"
+    if not _RESULTS_RE.search(html) or SCHOOL_LINK_MARKER not in html:
+        return True, "js-only (no #results cards in HTML)"
+    return False, "ok"
+
+
+def fetch_outcome(result):
+    """把一次抓取结果归类成限速器的 outcome：ok / blocked / timeout / error。"""
+    if result["status"] is None:
+        return "timeout" if "Timeout" in result["reason"] else "error"
+    if result["reason"].startswith("blocked"):
+        return "blocked"
+    return "ok"
+
+
+class HttpFetcher:
+    """
+    轻量 HTTP 抓取：后台线程里跑一个事件循环和一个持久的 httpx.AsyncClient
+    （连接池 + keep-alive + 压缩），对外提供同步接口，现有的同步爬虫可以直接调用。
+
+        with HttpFetcher(concurrency=4) as fetcher:
+            result = fetcher.fetch(url)
+            results = fetcher.fetch_many(urls)   # 并发，结果与 urls 同序
+
+    每个结果是 dict：url / status / html / needs_browser / reason。
+    """
+
+    def __init__(self, concurrency=4, timeout=20.0, headers=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="http-fetch-loop", daemon=True
+        )
+        self._thread.start()
+        self._client = self._run(self._open_client())
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _open_client(self):
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+            keepalive_expiry=30.0,
+        )
+        return httpx.AsyncClient(
+            headers=self.headers,
+            timeout=self.timeout,
+            limits=limits,
+            follow_redirects=True,
+        )
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _fetch(self, url):
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                resp = await self._client.get(url)
+            except httpx.HTTPError as e:
+                return {
+                    "url": url,
+                    "status": None,
+                    "html": None,
+                    "needs_browser": True,
+                    "reason": f"http error: {type(e).__name__}: {e}",
+                    "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "bytes": 0,
+                }
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        html = resp.text
+        needs_browser, reason = classify_html(resp.status_code, html)
+        return {
+            "url": url,
+            "status": resp.status_code,
+            "html": html,
+            "needs_browser": needs_browser,
+            "reason": reason,
+            "elapsed_ms": elapsed_ms,
+            "bytes": resp.num_bytes_downloaded,
+        }
+
+    async def _fetch_many(self, urls):
+        return await asyncio.gather(*(self._fetch(u) for u in urls))
+
+    def fetch(self, url):
+        return self._run(self._fetch(url))
+
+    def fetch_many(self, urls):
+        return self._run(self._fetch_many(list(urls)))
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self._run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    # 冒烟检查：对任意 BASE_URL（例如本地 fixture_server.py）抓几页并打印分类结果
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fetch result pages over HTTP and classify them.")
+    parser.add_argument("base_url")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    with HttpFetcher(concurrency=args.concurrency) as fetcher:
+        urls = [f"{args.base_url}?page={p}" for p in range(1, args.pages + 1)]
+        for r in fetcher.fetch_many(urls):
+            size = len(r["html"]) if r["html"] else 0
+            print(f"{r['url']}: status={r['status']} bytes={size} "
+                  f"needs_browser={r['needs_browser']} ({r['reason']})")
@@ -0,0 +1,107 @@
+import re
+
+
+SCHOOL_LINK_MARKER = "/education/k12/texas/"
+SCHOOL_URL_PREFIX = "https://www.usnews.com"
+
+# 站点 JSON 里同一个字段可能的键名（按优先级）。值本身是 dict 时取它的 name/value/displayValue。
+FIELD_ALIASES = {
+    "school_name": ("name", "schoolName", "school_name", "displayName", "title"),
+    "school_url": ("url", "profileUrl", "profile_url", "relativeUrl", "link", "href"),
+    "rank": ("rank", "stateRank", "ranking", "displayRank", "rankValue"),
+    "location": ("location", "cityState", "city_state"),
+    "city": ("city", "cityName"),
+    "state": ("state", "stateCode", "stateAbbreviation"),
+    "district": ("district", "districtName", "district_name"),
+    "grade_level": ("gradeLevel", "gradeLevels", "grades", "gradeSpan", "grade_level"),
+    "enrollment": ("enrollment", "totalEnrollment", "studentCount", "students"),
+    "student_teacher_ratio": ("studentTeacherRatio", "student_teacher_ratio", "pupilTeacherRatio"),
+}
+
+_NUMBER_RE = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+
+def _scalar(value):
+    if isinstance(value, dict):
+        for key in ("name", "displayValue", "value", "text"):
+            if key in value:
+                return _scalar(value[key])
+        return None
+    return value
+
+
+def _lookup(record, field):
+    for key in FIELD_ALIASES[field]:
+        if key in record and record[key] not in (None, ""):
+            return _scalar(record[key])
+    return None
+
+
+def to_int(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    m = _NUMBER_RE.search(str(value))
+    return int(float(m.group(0).replace(",", ""))) if m else None
+
+
+def to_ratio(value):
+    """师生比统一成“每位老师对应的学生数”（float）："17:1" / "17 to 1" / 17 -> 17.0"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    nums = _NUMBER_RE.findall(str(value))
+    if not nums:
+        return None
+    students = float(nums[0].replace(",", ""))
+    teachers = float(nums[1].replace(",", "")) if len(nums) > 1 else 1.0
+    return round(students / teachers, 2) if teachers else None
+
+
+def school_record(record, page_number):
+    """站点 JSON 里的一个学校对象 -> 和 DOM 提取同名的字段，数值字段带类型；不是学校时返回 None。"""
+    url = _lookup(record, "school_url")
+    name = _lookup(record, "school_name")
+    if not isinstance(url, str) or SCHOOL_LINK_MARKER not in url or "/districts/" in url:
+        return None
+    if not isinstance(name, str) or not name.strip():
+        return None
+
+    location = _lookup(record, "location")
+    if location is None:
+        city, state = _lookup(record, "city"), _lookup(record, "state")
+        if city and state:
+            location = f"{city}, {state}"
+    grade_level = _lookup(record, "grade_level")
+
+    return {
+        "page": page_number,
+        "rank": to_int(_lookup(record, "rank")),
+        "school_name": name.strip(),
+        "location": location,
+        "district": _lookup(record, "district"),
+        "grade_level": str(grade_level) if grade_level is not None else None,
+        "enrollment": to_int(_lookup(record, "enrollment")),
+        "student_teacher_ratio": to_ratio(_lookup(record, "student_teacher_ratio")),
+        "school_url": url if url.startswith("http") else SCHOOL_URL_PREFIX + url,
+        "source": "json",
+    }
+
+
+def find_school_records(payload, page_number):
+    """在任意结构的 JSON 里递归找学校对象，按出现顺序返回，并按 school_url 去重。"""
+    found = {}
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            rec = school_record(node, page_number)
+            if rec is not None:
+                found.setdefault(rec["school_url"], rec)
+                continue
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return list(found.values())
@@ -0,0 +1,240 @@
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # zstd 是可选的，没装就用 gzip
+    zstandard = None
+
+
+ARCHIVE_DIR = "page_archive"
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+SEGMENT_SUFFIX = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class PageArchive:
+    """
+    原始页面 HTML 的压缩归档（只追加）。
+
+    - 每个页面单独压缩成一个 gzip member / zstd frame，追加到当前分段文件
+      （segment_00001.gz ...），分段超过 segment_max_bytes 后换新文件
+    - index.sqlite 记录每条的 (page, fetched_at, segment, offset, length)，
+      按偏移直接 seek 读取，不用解压整个分段
+    - 同一页抓了多次会有多条记录，latest_entries() 取每页最新的一条
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR, codec=None, segment_max_bytes=SEGMENT_MAX_BYTES):
+        if codec is None:
+            codec = "zstd" if zstandard is not None else "gzip"
+        if codec == "zstd" and zstandard is None:
+            raise RuntimeError("codec='zstd' needs the zstandard package")
+        self.directory = directory
+        self.codec = codec
+        self.segment_max_bytes = segment_max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                id         INTEGER PRIMARY KEY,
+                page       INTEGER NOT NULL,
+                fetched_at REAL    NOT NULL,
+                url        TEXT,
+                segment    TEXT    NOT NULL,
+                offset     INTEGER NOT NULL,
+                length     INTEGER NOT NULL,
+                codec      TEXT    NOT NULL,
+                raw_size   INTEGER NOT NULL,
+                sha256     TEXT    NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_page ON records (page, fetched_at);
+            """
+        )
+        self._segment = None
+        self._fp = None
+
+    def _open_segment(self):
+        suffix = SEGMENT_SUFFIX[self.codec]
+        existing = sorted(f for f in os.listdir(self.directory) if f.startswith("segment_"))
+        if existing and existing[-1].endswith(suffix):
+            name = existing[-1]
+            if os.path.getsize(os.path.join(self.directory, name)) >= self.segment_max_bytes:
+                name = None
+        else:
+            name = None
+        if name is None:
+            name = f"segment_{len(existing) + 1:05d}{suffix}"
+        self._segment = name
+        # 没记进索引的尾巴（上次写到一半中断）不影响读取：索引只指向完整的记录
+        self._fp = open(os.path.join(self.directory, name), "ab")
+
+    def append(self, page, html, url=None, fetched_at=None):
+        raw = html.encode("utf-8") if isinstance(html, str) else html
+        blob = compress(raw, self.codec)
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self._lock:
+            if self._fp is None or self._fp.tell() >= self.segment_max_bytes:
+                if self._fp is not None:
+                    self._fp.close()
+                self._open_segment()
+            offset = self._fp.tell()
+            self._fp.write(blob)
+            self._fp.flush()
+            self._conn.execute(
+                "INSERT INTO records (page, fetched_at, url, segment, offset, length, codec, raw_size, sha256) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (page, fetched_at, url, self._segment, offset, len(blob), self.codec,
+                 len(raw), hashlib.sha256(raw).hexdigest()),
+            )
+
+    def entries(self, latest_only=True):
+        """索引记录（dict 列表，按页码排序）；latest_only 时每页只取最新一次抓取。"""
+        if latest_only:
+            sql = (
+                "SELECT r.* FROM records r JOIN ("
+                "  SELECT page, MAX(id) AS id FROM records GROUP BY page"
+                ") m ON r.id = m.id ORDER BY r.page"
+            )
+        else:
+            sql = "SELECT * FROM records ORDER BY page, fetched_at"
+        with self._lock:
+            cur = self._conn.execute(sql)
+            cols = [c[0] for c in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+    def read(self, entry):
+        return read_entry(self.directory, entry)
+
+    def get(self, page):
+        """某页最近一次抓取的 HTML；没有时返回 None。"""
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT * FROM records WHERE page=? ORDER BY id DESC LIMIT 1", (page,)
+            )
+            row = cur.fetchone()
+            cols = [c[0] for c in cur.description]
+        return self.read(dict(zip(cols, row))) if row else None
+
+    def stats(self):
+        with self._lock:
+            n, pages, raw, stored = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT page), SUM(raw_size), SUM(length) FROM records"
+            ).fetchone()
+        return {
+            "records": n,
+            "pages": pages,
+            "raw_bytes": raw or 0,
+            "stored_bytes": stored or 0,
+            "ratio": round((raw or 0) / stored, 1) if stored else None,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+            self._conn.close()
+
+
+def read_entry(directory, entry):
+    with open(os.path.join(directory, entry["segment"]), "rb") as f:
+        f.seek(entry["offset"])
+        blob = f.read(entry["length"])
+    return decompress(blob, entry["codec"]).decode("utf-8")
+
+
+# ----------------------------
+# 离线重新解析
+# ----------------------------
+def _reparse_entry(args):
+    """在子进程里跑：读一条归档记录并重新提取，返回 (page, rows, debug 行文本)。"""
+    directory, entry, engine = args
+    from bs4 import BeautifulSoup
+    from app import extract_schools_from_soup
+    from fast_extract import extract_schools_from_html
+
+    html = read_entry(directory, entry)
+    buf = io.StringIO()
+    if engine == "fast":
+        rows = extract_schools_from_html(html, entry["page"], debug_fp=buf)
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+        rows = extract_schools_from_soup(soup, entry["page"], debug_fp=buf)
+    return entry["page"], rows, buf.getvalue()
+
+
+def reparse(directory, rows_out, debug_out, workers=None, engine="soup"):
+    """
+    用当前的提取代码把归档里每页最新的 HTML 重新解析一遍（多进程），
+    按页码顺序写出行 JSONL 和 debug JSONL（格式同抓取时的 debug_raw_card_text.jsonl）。
+    """
+    archive = PageArchive(directory)
+    try:
+        entries = archive.entries(latest_only=True)
+    finally:
+        archive.close()
+
+    start = time.perf_counter()
+    n_rows = 0
+    tasks = [(directory, e, engine) for e in entries]
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(rows_out, "w", encoding="utf-8") as rows_fp, \
+            open(debug_out, "w", encoding="utf-8") as debug_fp:
+        # map 保持输入顺序，输出和按页抓取时一致
+        for page, rows, debug_text in pool.map(_reparse_entry, tasks, chunksize=8):
+            for row in rows:
+                rows_fp.write(json.dumps(row, ensure_ascii=False) + "\n")
+            debug_fp.write(debug_text)
+            n_rows += len(rows)
+    elapsed = time.perf_counter() - start
+    print(f"Re-parsed {len(entries)} pages ({n_rows} rows) in {elapsed:.2f}s "
+          f"({len(entries) / elapsed if elapsed else 0:.0f} pages/s).")
+    print(f"Rows -> {rows_out}, debug lines -> {debug_out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or re-parse the raw page archive.")
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help="archive directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("stats", help="show record counts and compression ratio")
+
+    p = sub.add_parser("reparse", help="re-run extraction over the archived pages")
+    p.add_argument("--rows-out", default="reparsed_rows.jsonl")
+    p.add_argument("--debug-out", default="debug_raw_card_text.reparsed.jsonl")
+    p.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    p.add_argument("--engine", choices=["soup", "fast"], default="soup")
+
+    args = parser.parse_args()
+    if args.command == "stats":
+        archive = PageArchive(args.dir)
+        print(archive.stats())
+        archive.close()
+    else:
+        reparse(args.dir, args.rows_out, args.debug_out, args.workers, args.engine)
@@ -0,0 +1,89 @@
+import time
+
+
+# 结果卡片里的学校链接（同一所学校的名字链接和 "Read More" 按 href 去重后计数）
+SCHOOL_LINK_SELECTOR = '#results a[href*="/education/k12/texas/"]:not([href*="/districts/"])'
+BLOCK_TITLE_MARKERS = ("Access Denied", "Just a moment")
+
+# 在页面里注入一个 MutationObserver：卡片数达到预期、且 DOM 连续 quiet_ms 没有变化时
+# 立即返回；卡片数不足（比如最后一页）时要安静更久才算完成；超过 timeout_ms 无论如何返回。
+# 拦截页（标题命中 BLOCK_TITLE_MARKERS）持续 block_grace_ms 仍没跳走，按 blocked 返回。
+_READY_SCRIPT = """
+const [selector, expected, quietMs, partialQuietMs, timeoutMs, blockGraceMs, blockMarkers] = arguments;
+const done = arguments[arguments.length - 1];
+const start = performance.now();
+let lastMutation = start;
+let mutations = 0;
+let blockedSince = null;
+const observer = new MutationObserver((records) => {
+    mutations += records.length;
+    lastMutation = performance.now();
+});
+observer.observe(document.documentElement, {
+    childList: true, subtree: true, attributes: true, characterData: true,
+});
+const countCards = () => {
+    const hrefs = new Set();
+    document.querySelectorAll(selector).forEach((a) => hrefs.add(a.getAttribute("href")));
+    return hrefs.size;
+};
+const finish = (state, cards) => {
+    observer.disconnect();
+    done({state: state, cards: cards, waited_ms: Math.round(performance.now() - start),
+          mutations: mutations});
+};
+const tick = () => {
+    const now = performance.now();
+    const cards = countCards();
+    const quietFor = now - lastMutation;
+    if (cards === 0 && blockMarkers.some((m) => document.title.includes(m))) {
+        if (blockedSince === null) blockedSince = now;
+        if (now - blockedSince >= blockGraceMs) return finish("blocked", cards);
+    } else {
+        blockedSince = null;
+    }
+    if (cards >= expected && quietFor >= quietMs) return finish("ready", cards);
+    if (cards > 0 && quietFor >= partialQuietMs) return finish("ready", cards);
+    if (now - start >= timeoutMs) return finish("timeout", cards);
+    setTimeout(tick, 50);
+};
+tick();
+"""
+
+
+def wait_for_page_ready(
+    driver,
+    expected_cards=10,
+    quiet_ms=400,
+    partial_quiet_ms=1500,
+    timeout=15.0,
+    block_grace_ms=3000,
+    selector=SCHOOL_LINK_SELECTOR,
+):
+    """
+    等页面“真正可以解析”再返回，代替 driver.get 之后的固定 sleep。
+    返回 dict：state（ready / timeout / blocked / error）、cards、waited_ms、mutations。
+    """
+    started = time.perf_counter()
+    try:
+        driver.set_script_timeout(timeout + 5)
+        result = driver.execute_async_script(
+            _READY_SCRIPT,
+            selector,
+            expected_cards,
+            quiet_ms,
+            partial_quiet_ms,
+            int(timeout * 1000),
+            block_grace_ms,
+            list(BLOCK_TITLE_MARKERS),
+        )
+    except Exception as e:
+        # 脚本执行期间页面跳转（比如拦截页放行后重定向）也会走到这里
+        return {
+            "state": "error",
+            "cards": 0,
+            "waited_ms": round((time.perf_counter() - started) * 1000),
+            "mutations": 0,
+            "error": f"{type(e).__name__}: {e}",
+        }
+    return result
@@ -0,0 +1,120 @@
+import json
+import random
+import threading
+import time
+from collections import deque
+
+
+class AdaptiveRateLimiter:
+    """
+    所有爬虫共享的请求节奏控制：令牌桶 + AIMD（加性增、乘性减）。
+
+    - acquire()：每次打开页面前调用，按当前速率发放令牌（线程安全，多个 worker 共用一个实例）
+    - record(outcome)：把页面结果反馈回来
+        ok               -> 加性提速（+increase 次/秒，不超过 max_rate）
+        blocked/timeout/error -> 乘性降速（×decrease_factor，不低于 min_rate），
+                            清空令牌并进入 cooldown 秒的冷却期，冷却期内不提速
+        empty 等其它结果   -> 保持不变
+    - 每次调速都按动作计数（action_counts），最近 RECENT_DECISIONS 次留在 decisions 里，
+      完整记录追加写到 log_path（JSONL）；长时间运行内存不会一直涨
+    """
+
+    BACKOFF_OUTCOMES = {"blocked", "timeout", "error"}
+    RECENT_DECISIONS = 100
+
+    def __init__(
+        self,
+        initial_rate=0.2,
+        min_rate=0.02,
+        max_rate=2.0,
+        increase=0.02,
+        decrease_factor=0.5,
+        burst=1.0,
+        cooldown=60.0,
+        jitter=0.25,
+        log_path=None,
+    ):
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.burst = burst
+        self.cooldown = cooldown
+        self.jitter = jitter
+        self.log_path = log_path
+
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._cooldown_until = 0.0
+        self.decisions = deque(maxlen=self.RECENT_DECISIONS)
+        self.action_counts = {"decrease": 0, "increase": 0}
+        self.counts = {}
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌；返回实际等待的秒数。"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    break
+                delay = (1.0 - self._tokens) / self.rate
+            # 加一点随机抖动，避免请求间隔过于规律
+            delay *= 1.0 + random.uniform(0, self.jitter)
+            time.sleep(delay)
+            waited += delay
+        return waited
+
+    def record(self, outcome, detail=None):
+        with self._lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+            now = time.monotonic()
+            old_rate = self.rate
+            if outcome in self.BACKOFF_OUTCOMES:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._tokens = 0.0
+                self._cooldown_until = now + self.cooldown
+                action = "decrease"
+            elif outcome == "ok" and now >= self._cooldown_until:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+                action = "increase"
+            else:
+                return self.rate
+            if self.rate != old_rate or action == "decrease":
+                self._log_decision(action, outcome, old_rate, detail)
+            return self.rate
+
+    def _log_decision(self, action, outcome, old_rate, detail):
+        decision = {
+            "ts": time.time(),
+            "action": action,
+            "outcome": outcome,
+            "rate_before": round(old_rate, 4),
+            "rate_after": round(self.rate, 4),
+            "detail": detail,
+        }
+        self.decisions.append(decision)
+        self.action_counts[action] += 1
+        if action == "decrease":
+            print(f"[rate] {outcome}: {old_rate:.3f} -> {self.rate:.3f} req/s "
+                  f"(cooling down {self.cooldown:.0f}s)")
+        if self.log_path:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(decision, ensure_ascii=False) + "\n")
+
+    def summary(self):
+        with self._lock:
+            return {
+                "rate": round(self.rate, 4),
+                "outcomes": dict(self.counts),
+                "decreases": self.action_counts["decrease"],
+                "increases": self.action_counts["increase"],
+            }
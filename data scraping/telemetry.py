@@ -0,0 +1,136 @@
+import argparse
+import json
+import math
+import threading
+import time
+
+
+# 每页记录的阶段耗时（毫秒）。没经过的阶段不写（例如 HTTP 抓到的页没有 wait_ms）
+STAGES = ("fetch_ms", "navigate_ms", "wait_ms", "parse_ms", "write_ms")
+
+
+def percentile(values, q):
+    """最近秩百分位数（q 取 0~100）；空列表返回 None。"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[k]
+
+
+def summarize(records, elapsed=None):
+    """
+    从逐页记录算整次运行的汇总：页数、行数、rows/sec、拦截率、状态分布、
+    各阶段 p50/p95。elapsed 不给时用记录里第一页开始到最后一页结束的时间。
+    """
+    records = list(records)
+    if not records:
+        return {"pages": 0}
+    if elapsed is None:
+        elapsed = max(r["ts"] for r in records) - min(r["ts"] - r.get("total_ms", 0) / 1000 for r in records)
+
+    statuses = {}
+    for r in records:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    rows = sum(r.get("rows", 0) for r in records)
+    blocked = sum(1 for r in records if r.get("blocked"))
+
+    stages = {}
+    for stage in STAGES + ("total_ms",):
+        values = [r[stage] for r in records if r.get(stage) is not None]
+        if values:
+            stages[stage] = {
+                "p50": round(percentile(values, 50), 1),
+                "p95": round(percentile(values, 95), 1),
+                "max": round(max(values), 1),
+            }
+    return {
+        "pages": len(records),
+        "rows": rows,
+        "elapsed_s": round(elapsed, 1),
+        "rows_per_sec": round(rows / elapsed, 2) if elapsed > 0 else None,
+        "pages_per_sec": round(len(records) / elapsed, 3) if elapsed > 0 else None,
+        "block_rate": round(blocked / len(records), 3),
+        "retried_pages": sum(1 for r in records if r.get("retries")),
+        "bytes": sum(r.get("bytes") or 0 for r in records),
+        "status": statuses,
+        "stages": stages,
+    }
+
+
+class PageTelemetry:
+    """
+    逐页的阶段耗时记录（JSONL），多个线程 / worker 可以共用。
+
+    各阶段在不同的函数（甚至不同的线程）里发生，先用 stage / note 按页号累计，
+    页面最终落盘（或记为失败）时 finish 写出一行：
+    page, status, rows, bytes, blocked, retries, fetch/navigate/wait/parse/write_ms, total_ms
+    retries 是本次运行里这一页之前已经结束过几次（失败后重抓）。
+    blocked：最终状态是 blocked，或者途中被拦截过（note(page, blocked=True)，
+    例如 HTTP 被拦截后由浏览器补抓成功）。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._open = {}
+        self._finished = {}
+        self._records = []
+        self._started = time.time()
+
+    def stage(self, page, name, ms):
+        with self._lock:
+            entry = self._open.setdefault(page, {"start": time.time() - ms / 1000})
+            entry[name] = round(entry.get(name, 0) + ms, 1)
+
+    def note(self, page, **fields):
+        with self._lock:
+            self._open.setdefault(page, {"start": time.time()}).update(fields)
+
+    def finish(self, page, status, rows=0, write_ms=None):
+        with self._lock:
+            entry = self._open.pop(page, {"start": time.time()})
+            start = entry.pop("start")
+            if write_ms is not None:
+                entry["write_ms"] = round(write_ms, 1)
+            retries = self._finished.get(page, 0)
+            self._finished[page] = retries + 1
+            now = time.time()
+            record = {
+                "ts": round(now, 3),
+                "page": page,
+                "status": status,
+                "rows": rows,
+                "bytes": entry.pop("bytes", None),
+                "blocked": status == "blocked" or bool(entry.pop("blocked", False)),
+                "retries": retries,
+                **entry,
+                "total_ms": round((now - start) * 1000, 1),
+            }
+            self._records.append(record)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self):
+        with self._lock:
+            records = list(self._records)
+            elapsed = time.time() - self._started
+        return summarize(records, elapsed)
+
+
+def load_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize per-page scraper telemetry (rows/sec, p50/p95 stage latency, block rate).")
+    parser.add_argument("path", nargs="?", default="page_telemetry.jsonl")
+    parser.add_argument("--since", type=float, default=None,
+                        help="only records with ts >= this unix time (e.g. one run out of an appended log)")
+    args = parser.parse_args()
+
+    records = load_records(args.path)
+    if args.since is not None:
+        records = [r for r in records if r["ts"] >= args.since]
+    print(json.dumps(summarize(records), indent=2, ensure_ascii=False))
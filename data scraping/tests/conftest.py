@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 被测模块都平铺在 data scraping/ 下，按脚本的方式 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+import pytest
+
+from enrich_details import DetailCache, enrich_records, fetch_all
+from fixture_server import fixture_stats, start_fixture_server
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SCHOOL_URL = "https://www.usnews.com/education/k12/texas/carver-center-100000"
+MISSING_URL = "https://www.usnews.com/education/k12/texas/no-such-school-1"
+
+
+@pytest.fixture
+def fixture_origin():
+    server, _ = start_fixture_server(FIXTURE_DIR)
+    yield server, "http://%s:%d" % server.server_address
+    server.shutdown()
+
+
+def test_second_run_revalidates_with_etag_and_reuses_cache(fixture_origin, tmp_path):
+    server, origin = fixture_origin
+    cache = DetailCache(str(tmp_path / "cache"))
+
+    first, stats = asyncio.run(fetch_all([SCHOOL_URL, MISSING_URL], cache, origin=origin))
+    assert stats == {"fetched": 1, "not_modified": 0, "error": 1}
+    assert set(first) == {SCHOOL_URL}
+
+    second, stats = asyncio.run(fetch_all([SCHOOL_URL], cache, origin=origin))
+    assert stats == {"fetched": 0, "not_modified": 1, "error": 0}
+    assert fixture_stats(server)["http_304"] == 1
+    # 304 时用缓存里的页面解析，结果和第一次一样
+    assert second == first
+
+
+def test_enrich_records_merges_parsed_fields(fixture_origin, tmp_path):
+    _, origin = fixture_origin
+    details, _ = asyncio.run(fetch_all([SCHOOL_URL], DetailCache(str(tmp_path)), origin=origin))
+    records = [
+        {"school_name": "Carver Center", "description": "Carver Center is a ...",
+         "source_meta": {"school_url": SCHOOL_URL}},
+        {"school_name": "Elsewhere", "description": "kept", "source_meta": {"school_url": MISSING_URL}},
+    ]
+
+    assert enrich_records(records, details) == 1
+    assert records[0]["description"].startswith("Carver Center is a magnet school")
+    assert records[0]["details"] == {
+        "Grades": "1-6",
+        "Student-Teacher Ratio": "17:1",
+        "Total Economically Disadvantaged": "23%",
+    }
+    assert records[1] == {"school_name": "Elsewhere", "description": "kept",
+                          "source_meta": {"school_url": MISSING_URL}}
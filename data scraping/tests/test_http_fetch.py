@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import http_fetch
+from fixture_server import fixture_stats, start_fixture_server
+from http_fetch import HttpFetcher
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@pytest.fixture
+def fixture_site():
+    server, base_url = start_fixture_server(FIXTURE_DIR)
+    yield server, base_url
+    server.shutdown()
+
+
+def test_cards_in_html_need_no_browser(fixture_site):
+    server, base_url = fixture_site
+    with HttpFetcher(concurrency=2) as fetcher:
+        result = fetcher.fetch(f"{base_url}?page=1")
+    assert result["status"] == 200
+    assert not result["needs_browser"], result["reason"]
+    assert "/education/k12/texas/carver-center-100000" in result["html"]
+    # 压缩传输：下载的字节数比解压后的 HTML 小
+    assert 0 < result["bytes"] < len(result["html"].encode("utf-8"))
+
+
+def test_js_only_and_missing_pages_fall_back_to_browser(fixture_site):
+    server, base_url = fixture_site
+    with HttpFetcher(concurrency=2) as fetcher:
+        js_only, missing = fetcher.fetch_many([f"{base_url}?page=2", f"{base_url}?page=99"])
+    assert js_only["needs_browser"] and js_only["reason"].startswith("js-only")
+    assert missing["needs_browser"] and missing["reason"] == "HTTP 404"
+    assert fixture_stats(server)["requests"] == 2
+
+
+def test_blocked_response_is_classified_as_blocked():
+    server, base_url = start_fixture_server(FIXTURE_DIR, block_rate=1.0)
+    try:
+        with HttpFetcher() as fetcher:
+            result = fetcher.fetch(f"{base_url}?page=1")
+    finally:
+        server.shutdown()
+    assert result["needs_browser"]
+    assert http_fetch.fetch_outcome(result) == "blocked"
+
+
+def test_br_is_only_offered_when_it_can_be_decoded():
+    offered = "br" in http_fetch.DEFAULT_HEADERS["Accept-Encoding"]
+    assert offered == (http_fetch.brotli is not None)
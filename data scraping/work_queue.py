@@ -0,0 +1,347 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+
+class WorkQueue:
+    """
+    文件型的页任务队列（SQLite），多个抓取进程 / 多台机器（共享文件系统）可以同时领任务。
+
+    - 任务状态：pending / leased / done / failed
+    - claim 在一个写事务里把一页标成 leased 并写上租约到期时间，同一页不会同时被两个 worker 领走
+    - 干活期间定时 heartbeat 续租；worker 死掉后租约过期，这一页会被别的 worker 重新领走
+    - complete 只在租约仍归自己时生效（过期后被别人接手的页，以接手者的结果为准）
+    - 每个 worker 写自己的输出文件，已提交的字节偏移和页状态在同一个事务里记进 outputs 表，
+      merge 只读到提交偏移为止，崩溃留下的半截内容不会混进最终结果
+    - outputs.kind 区分输出种类：debug（卡片 debug 行）/ records（JSON 捕获模式的记录），分开合并
+
+    跨机器共享时数据库放在共享目录上，journal_mode 用默认的 DELETE
+    （WAL 依赖共享内存，只能在同一台机器上用）。
+    """
+
+    def __init__(self, path, max_attempts=5, backoff_base=30.0, backoff_cap=900.0, journal_mode="DELETE"):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+        # 其它进程持有写锁时最多等 60 秒
+        self._conn = sqlite3.connect(path, timeout=60.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                page            INTEGER PRIMARY KEY,
+                state           TEXT    NOT NULL DEFAULT 'pending',
+                owner           TEXT,
+                lease_until     REAL,
+                attempts        INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL    NOT NULL DEFAULT 0,
+                status          TEXT,
+                row_count       INTEGER,
+                updated_at      REAL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, next_attempt_at);
+            CREATE TABLE IF NOT EXISTS outputs (
+                path             TEXT PRIMARY KEY,
+                owner            TEXT,
+                committed_offset INTEGER NOT NULL DEFAULT 0,
+                updated_at       REAL,
+                kind             TEXT    NOT NULL DEFAULT 'debug'
+            );
+            """
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(outputs)")]
+        if "kind" not in columns:
+            # 旧版本建的库：已有的输出都是 debug 行
+            self._conn.execute("ALTER TABLE outputs ADD COLUMN kind TEXT NOT NULL DEFAULT 'debug'")
+
+    def publish(self, pages):
+        """发布任务（已存在的页不动），返回新增的页数。"""
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO tasks (page) VALUES (?)", [(p,) for p in pages]
+            )
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def claim(self, worker_id, lease_seconds):
+        """
+        领一页：退避时间已到的 pending 页，或租约已过期的 leased 页（按页码顺序）。
+        没有可领的页时返回 None。
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT page, state, owner FROM tasks "
+                    "WHERE (state='pending' AND next_attempt_at <= ?) "
+                    "   OR (state='leased' AND lease_until < ?) "
+                    "ORDER BY page LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                page, state, previous_owner = row
+                self._conn.execute(
+                    "UPDATE tasks SET state='leased', owner=?, lease_until=?, "
+                    "attempts=attempts+1, updated_at=? WHERE page=?",
+                    (worker_id, now + lease_seconds, now, page),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if state == "leased":
+            print(f"[queue] page {page}: lease of {previous_owner} expired, re-queued to {worker_id}")
+        return page
+
+    def heartbeat(self, worker_id, page, lease_seconds):
+        """续租；租约已经不归自己（过期后被别人领走）时返回 False。"""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE tasks SET lease_until=?, updated_at=? "
+                "WHERE page=? AND state='leased' AND owner=?",
+                (now + lease_seconds, now, page, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, worker_id, page, status, row_count=None, output_path=None, output_offset=None,
+                 records_path=None, records_offset=None):
+        """
+        提交一页的结果：ok 记为 done，其它状态按指数退避放回 pending，超过 max_attempts 记为 failed。
+        empty 也要重试（一页没解析出学校多半是没加载完），和单进程台账的规则一致。
+        output_path / output_offset（以及捕获模式的 records_path / records_offset）
+        和页状态在同一个事务里提交。
+        租约已经不归自己时什么都不写，返回 False（调用方应丢弃这页的输出）。
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT attempts FROM tasks WHERE page=? AND state='leased' AND owner=?",
+                    (page, worker_id),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return False
+
+                attempts = row[0]
+                if status == "ok":
+                    state, next_at = "done", 0
+                elif attempts >= self.max_attempts:
+                    state, next_at = "failed", 0
+                else:
+                    state = "pending"
+                    delay = min(self.backoff_cap, self.backoff_base * 2 ** (attempts - 1))
+                    next_at = now + delay * random.uniform(0.8, 1.2)
+                self._conn.execute(
+                    "UPDATE tasks SET state=?, owner=NULL, lease_until=NULL, next_attempt_at=?, "
+                    "status=?, row_count=?, updated_at=? WHERE page=?",
+                    (state, next_at, status, row_count, now, page),
+                )
+                for kind, path, offset in (
+                    ("debug", output_path, output_offset),
+                    ("records", records_path, records_offset),
+                ):
+                    if path is None or offset is None:
+                        continue
+                    self._conn.execute(
+                        "INSERT INTO outputs (path, owner, committed_offset, updated_at, kind) "
+                        "VALUES (?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+                        "committed_offset=excluded.committed_offset, updated_at=excluded.updated_at",
+                        (path, worker_id, offset, now, kind),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def seconds_until_next_task(self, now=None):
+        """
+        距离下一页可能可领还要等多久（退避到期或别人的租约到期）；
+        所有页都已 done / failed 时返回 None。
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(CASE WHEN state='leased' THEN lease_until ELSE next_attempt_at END) "
+                "FROM tasks WHERE state IN ('pending', 'leased')"
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - now)
+
+    def outputs(self, kind=None):
+        """[(path, committed_offset), ...]，按路径排序；给了 kind 时只要这一种输出。"""
+        with self._lock:
+            if kind is None:
+                return self._conn.execute(
+                    "SELECT path, committed_offset FROM outputs ORDER BY path"
+                ).fetchall()
+            return self._conn.execute(
+                "SELECT path, committed_offset FROM outputs WHERE kind=? ORDER BY path", (kind,)
+            ).fetchall()
+
+    def summary(self):
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*), SUM(COALESCE(row_count, 0)) FROM tasks GROUP BY state"
+            ).fetchall()
+            expired = self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE state='leased' AND lease_until < ?", (now,)
+            ).fetchone()[0]
+            owners = self._conn.execute(
+                "SELECT owner, COUNT(*) FROM tasks WHERE state='leased' GROUP BY owner"
+            ).fetchall()
+        result = {state: {"pages": n, "rows": r} for state, n, r in rows}
+        result["expired_leases"] = expired
+        result["active_workers"] = dict(owners)
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LeaseKeeper:
+    """
+    后台线程定时续租（每 lease_seconds / 3 秒一次）。用法：
+
+        with LeaseKeeper(queue, worker_id, page, lease_seconds) as lease:
+            ...  # 抓取这一页
+        if lease.lost: ...  # 中途租约丢了，这页已经被别人接手
+    """
+
+    def __init__(self, queue, worker_id, page, lease_seconds):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.page = page
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{page}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(self.worker_id, self.page, self.lease_seconds):
+                    self.lost = True
+                    return
+            except sqlite3.Error as e:
+                # 数据库暂时被锁住等情况：下次再续，租约还有余量
+                print(f"[queue] heartbeat for page {self.page} failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+MERGED_JSONL = "merged_raw_card_text.jsonl"
+
+
+def index_output(path, offset):
+    """
+    扫一遍 worker 输出文件的已提交部分，返回 [(page, start, end), ...]：
+    每页在文件里是连续的一段字节（worker 一次写完一页）。只保存位置，不保存内容。
+    """
+    spans = []
+    pos = 0
+    with open(path, "rb") as f:
+        while pos < offset:
+            line = f.readline()
+            if not line:
+                break
+            end = min(pos + len(line), offset)
+            page = json.loads(line).get("page") if line.endswith(b"\n") else None
+            if page is None:
+                break  # 提交偏移之后的半行不会出现；出现了说明文件被改过，后面的不要
+            if spans and spans[-1][0] == page and spans[-1][2] == pos:
+                spans[-1] = (page, spans[-1][1], end)
+            else:
+                spans.append((page, pos, end))
+            pos = end
+    return spans
+
+
+def merge_outputs(queue, out_path=MERGED_JSONL, kind="debug"):
+    """
+    把各 worker 的 kind 类输出文件（只读到已提交的偏移）按页码合并成一个 JSONL，
+    同一页内保持原来的行序。先建“页 -> 文件位置”的索引，再逐段拷贝，内存里只有索引。
+    返回 (写出的行数, 文件数)。
+    """
+    spans_by_page = {}
+    outputs = queue.outputs(kind)
+    for path, offset in outputs:
+        if not os.path.exists(path):
+            print(f"[merge] missing output file {path}, skipped")
+            continue
+        for page, start, end in index_output(path, offset):
+            spans_by_page.setdefault(page, []).append((path, start, end))
+
+    written = 0
+    files = {}
+    try:
+        with open(out_path, "wb") as out:
+            for page in sorted(spans_by_page):
+                for path, start, end in spans_by_page[page]:
+                    f = files.get(path)
+                    if f is None:
+                        f = files[path] = open(path, "rb")
+                    f.seek(start)
+                    remaining = end - start
+                    while remaining:
+                        chunk = f.read(min(remaining, 1 << 20))
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        written += chunk.count(b"\n")
+                        remaining -= len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+    return written, len(outputs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the shared page work queue or merge worker outputs.")
+    parser.add_argument("db", help="queue database, e.g. work_queue.sqlite")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pub = sub.add_parser("publish", help="publish pages start..end as tasks")
+    pub.add_argument("start", type=int)
+    pub.add_argument("end", type=int)
+    sub.add_parser("status", help="print task counts by state")
+    merge = sub.add_parser("merge", help="merge committed worker outputs in page order")
+    merge.add_argument("out_path", nargs="?", default=MERGED_JSONL)
+    merge.add_argument("--kind", choices=("debug", "records"), default="debug",
+                       help="records: merge the JSON-capture record files instead of debug lines")
+    args = parser.parse_args()
+
+    wq = WorkQueue(args.db)
+    try:
+        if args.command == "publish":
+            print(f"Published {wq.publish(range(args.start, args.end + 1))} new page(s).")
+        elif args.command == "status":
+            print(json.dumps(wq.summary(), indent=2))
+        else:
+            n_lines, n_files = merge_outputs(wq, args.out_path, args.kind)
+            print(f"Merged {n_lines} line(s) from {n_files} worker file(s) into {args.out_path}")
+    finally:
+        wq.close()